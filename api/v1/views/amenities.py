@@ -5,6 +5,7 @@ objects.
 """
 from flask import jsonify, abort, request
 from api.v1.views import app_views
+from api.v1.views.pagination import paginate
 from models.amenity import Amenity
 from models import storage
 
@@ -12,11 +13,7 @@ from models import storage
 @app_views.route('/amenities', strict_slashes=False, methods=['GET'])
 def get_amenities():
     """ Retrieves list of all Amenity objects """
-    amenities = storage.all(Amenity).values()
-    amenities_in_json = []
-    for amenity in amenities:
-        amenities_in_json.append(amenity.to_dict())
-    return jsonify(amenities_in_json)
+    return paginate(Amenity)
 
 
 @app_views.route('/amenities/<amenity_id>', methods=['GET'],
@@ -5,6 +5,7 @@ objects.
 """
 from flask import jsonify, abort, request
 from api.v1.views import app_views
+from api.v1.views.pagination import paginate
 from models.state import State
 from models.city import City
 from models import storage
@@ -19,11 +20,7 @@ def get_cities(state_id):
     if not state:
         abort(404)
 
-    cities = state.cities
-    cities_in_json = []
-    for city in cities:
-        cities_in_json.append(city.to_dict())
-    return jsonify(cities_in_json)
+    return paginate(City, state_id=state_id)
 
 
 @app_views.route('/cities/<city_id>', methods=['GET'], strict_slashes=False)
@@ -23,8 +23,19 @@ def return_stats():
     from models.amenity import Amenity
     models = {"amenities": Amenity, "cities": City, "places": Place,
               "reviews": Review, "states": State, "users": User}
+    counts = storage.counts(*models.values())
     model_stats = {}
     for key, value in models.items():
-        model_stats[key] = storage.count(value)
+        model_stats[key] = counts[value.__name__]
 
     return jsonify(model_stats)
+
+
+@app_views.route('/pool')
+def return_pool():
+    """ Returns the counters of the database connection pool """
+    from flask import abort
+    from models import storage
+    if not hasattr(storage, "pool_stats"):
+        abort(404)
+    return jsonify(storage.pool_stats())
@@ -0,0 +1,74 @@
+#!/usr/bin/python3
+"""
+Pages the list endpoints of the API.
+
+A list request may carry limit, offset and cursor arguments. The objects
+are sorted by (created_at, id) and read one page at a time from storage,
+so DBStorage issues a LIMIT query. When there is a next page, its opaque
+cursor is sent in the X-Next-Cursor header and its URL in a Link header.
+The body joins the JSON text cached by each object instead of encoding it.
+"""
+import base64
+from datetime import datetime
+from flask import Response, abort, request
+import json
+from models import storage
+from models.base_model import time
+from urllib.parse import urlencode
+
+order = ["created_at", "id"]
+
+
+def encode_cursor(obj):
+    """returns the cursor of the page following obj"""
+    values = [obj.created_at.strftime(time), obj.id]
+    cursor = base64.urlsafe_b64encode(json.dumps(values).encode())
+    return cursor.decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """returns the (created_at, id) values a cursor points after"""
+    try:
+        created_at, obj_id = json.loads(base64.urlsafe_b64decode(
+            (cursor + "=" * (-len(cursor) % 4)).encode()).decode())
+        return (datetime.strptime(created_at, time), str(obj_id))
+    except Exception:
+        abort(400, description="Invalid cursor")
+
+
+def integer_arg(name, minimum):
+    """returns the integer request argument name, None if it is missing"""
+    value = request.args.get(name)
+    if value is None:
+        return None
+    try:
+        value = int(value)
+    except ValueError:
+        abort(400, description="Invalid {}".format(name))
+    if value < minimum:
+        abort(400, description="Invalid {}".format(name))
+    return value
+
+
+def paginate(cls, **equals):
+    """returns the JSON response listing the objects of cls whose
+    attributes equal the values in equals, paged by the request"""
+    limit = integer_arg("limit", 1)
+    offset = integer_arg("offset", 0) or 0
+    cursor = request.args.get("cursor")
+    after = decode_cursor(cursor) if cursor is not None else None
+    # one more object than asked tells whether there is a next page
+    objs = storage.filter(cls, order_by=order, offset=offset, after=after,
+                          limit=None if limit is None else limit + 1,
+                          **equals)
+    # the JSON text each object caches is reused as is
+    response = Response("[" + ", ".join(obj.to_json()
+                                        for obj in objs[:limit]) + "]\n",
+                        mimetype="application/json")
+    if limit is not None and len(objs) > limit:
+        next_cursor = encode_cursor(objs[limit - 1])
+        url = request.base_url + "?" + urlencode({"limit": limit,
+                                                  "cursor": next_cursor})
+        response.headers["X-Next-Cursor"] = next_cursor
+        response.headers["Link"] = '<{}>; rel="next"'.format(url)
+    return response
@@ -3,6 +3,7 @@
 objects.
 """
 from api.v1.views import app_views
+from api.v1.views.pagination import paginate
 from flask import jsonify, abort, request, make_response
 from models import storage
 from models.city import City
@@ -18,12 +19,7 @@ def get_places(city_id):
     if not city:
         abort(404)
 
-    places = storage.all(Place).values()
-    places_in_json = []
-    for place in places:
-        if place.city_id == city_id:
-            places_in_json.append(place.to_dict())
-    return jsonify(places_in_json)
+    return paginate(Place, city_id=city_id)
 
 
 @app_views.route('/places/<place_id>', methods=['GET'], strict_slashes=False)
@@ -3,6 +3,7 @@
 objects.
 """
 from api.v1.views import app_views
+from api.v1.views.pagination import paginate
 from flask import jsonify, abort, request, make_response
 from models import storage
 from models.place import Place
@@ -18,12 +19,7 @@ def get_reviews(place_id):
     if not place:
         abort(404)
 
-    reviews = storage.all(Review).values()
-    reviews_in_json = []
-    for review in reviews:
-        if review.place_id == place_id:
-            reviews_in_json.append(review.to_dict())
-    return jsonify(reviews_in_json)
+    return paginate(Review, place_id=place_id)
 
 
 @app_views.route('/reviews/<review_id>', methods=['GET'], strict_slashes=False)
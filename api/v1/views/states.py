@@ -5,6 +5,7 @@ objects.
 """
 from flask import jsonify, abort, request
 from api.v1.views import app_views
+from api.v1.views.pagination import paginate
 from models.state import State
 from models import storage
 
@@ -12,11 +13,7 @@ from models import storage
 @app_views.route('/states', strict_slashes=False, methods=['GET'])
 def get_states():
     """ Retrieves list of all State objects """
-    states = storage.all(State).values()
-    states_in_json = []
-    for state in states:
-        states_in_json.append(state.to_dict())
-    return jsonify(states_in_json)
+    return paginate(State)
 
 
 @app_views.route('/states/<state_id>', methods=['GET'], strict_slashes=False)
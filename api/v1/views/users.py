@@ -3,19 +3,22 @@
 objects.
 """
 from api.v1.views import app_views
+from api.v1.views.pagination import paginate
 from flask import jsonify, abort, request, make_response
 from models import storage
 from models.user import User
 
 
+def email_taken(email, user_id=None):
+    """ Tells if another user than user_id already has the email """
+    return any(user.id != user_id
+               for user in storage.filter(User, email=email, limit=2))
+
+
 @app_views.route('/users', strict_slashes=False, methods=['GET'])
 def get_users():
     """ Retrieves list of all User objects """
-    users = storage.all(User).values()
-    users_in_json = []
-    for user in users:
-        users_in_json.append(user.to_dict())
-    return jsonify(users_in_json)
+    return paginate(User)
 
 
 @app_views.route('/users/<user_id>', methods=['GET'], strict_slashes=False)
@@ -51,6 +54,8 @@ def create_user():
         return make_response(jsonify({"error": "Missing email"}), 400)
     if "password" not in request_data:
         return make_response(jsonify({"error": "Missing password"}), 400)
+    if email_taken(request_data["email"]):
+        return make_response(jsonify({"error": "Email already used"}), 409)
 
     new_user = User(**request_data)
     new_user.save()
@@ -68,6 +73,9 @@ def update_user(user_id):
         request_data = request.get_json()
     except Exception as e:
         return make_response(jsonify({"error": "Not a JSON"}), 400)
+    if "email" in request_data and \
+            email_taken(request_data["email"], user.id):
+        return make_response(jsonify({"error": "Email already used"}), 409)
 
     for key, value in request_data.items():
         if key not in ['id', 'created_at', 'updated_at']:
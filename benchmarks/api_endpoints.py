@@ -0,0 +1,99 @@
+#!/usr/bin/python3
+"""
+Times the hot endpoints of the API and counts the SQL statements each
+request sends, on DBStorage over an in-memory SQLite database unless
+HBNB_TYPE_STORAGE and HBNB_DB_URL say otherwise
+
+Usage: python3 -m benchmarks.api_endpoints [number of states] [requests]
+       add --profile to print the functions taking the most time
+"""
+
+from benchmarks import db_defaults
+import cProfile
+import models
+import pstats
+from sqlalchemy import event
+import sys
+import time
+from api.v1.app import app
+from models import storage
+from models.city import City
+from models.place import Place
+from models.review import Review
+from models.state import State
+from models.user import User
+
+
+def populate(size):
+    """stores size states of 5 cities of 4 places with 3 reviews each
+    and returns the first state, city and place"""
+    user = User(email="bench@hbnb.io", password="bench")
+    objs = [user]
+    for i in range(size):
+        state = State(name="State {}".format(i))
+        objs.append(state)
+        for j in range(5):
+            city = City(name="City {}".format(j), state_id=state.id)
+            objs.append(city)
+            for k in range(4):
+                place = Place(name="Place {}".format(k), city_id=city.id,
+                              user_id=user.id)
+                objs.append(place)
+                objs.extend(Review(text="Review {}".format(n),
+                                   place_id=place.id, user_id=user.id)
+                            for n in range(3))
+    storage.bulk_new(objs)
+    storage.save()
+    storage.close()
+    return objs[1], objs[2], objs[3]
+
+
+def endpoints(state, city, place):
+    """returns the URLs to time"""
+    return ["/api/v1/stats", "/api/v1/states", "/api/v1/states?limit=20",
+            "/api/v1/states/{}".format(state.id),
+            "/api/v1/states/{}/cities".format(state.id),
+            "/api/v1/cities/{}/places".format(city.id),
+            "/api/v1/places/{}/reviews".format(place.id),
+            "/api/v1/users?limit=20"]
+
+
+def measure(client, url, requests):
+    """prints the mean latency and SQL statements of GET url"""
+    statements = []
+
+    def count(*args):
+        """counts a statement"""
+        statements.append(1)
+    engine = getattr(storage, "_DBStorage__engine", None)
+    if engine is not None:
+        event.listen(engine, "before_cursor_execute", count)
+    start = time.perf_counter()
+    for i in range(requests):
+        response = client.get(url)
+        if response.status_code != 200:
+            raise RuntimeError("{} returned {}".format(
+                url, response.status_code))
+    elapsed = time.perf_counter() - start
+    if engine is not None:
+        event.remove(engine, "before_cursor_execute", count)
+    print("{:<60} {:>8.2f} ms {:>6.1f} statements".format(
+        url, elapsed / requests * 1000, len(statements) / requests))
+
+
+if __name__ == "__main__":
+    profile = "--profile" in sys.argv
+    args = [arg for arg in sys.argv[1:] if arg != "--profile"]
+    size = int(args[0]) if args else 100
+    requests = int(args[1]) if len(args) > 1 else 20
+    print("{} storage, {} states".format(models.storage_t or "file", size))
+    urls = endpoints(*populate(size))
+    client = app.test_client()
+    profiler = cProfile.Profile()
+    if profile:
+        profiler.enable()
+    for url in urls:
+        measure(client, url, requests)
+    if profile:
+        profiler.disable()
+        pstats.Stats(profiler).sort_stats("cumulative").print_stats(25)
@@ -0,0 +1,64 @@
+#!/usr/bin/python3
+"""
+Compares the time to store places one at a time, with new() then save()
+for each of them, and in bulk, with one bulk_new() then one save(), on the
+storage engine selected by HBNB_TYPE_STORAGE
+
+Usage: python3 -m benchmarks.bulk_insert [number of places]
+"""
+
+import models
+import os
+import sys
+import tempfile
+import time
+from models.city import City
+from models.place import Place
+from models.state import State
+from models.user import User
+
+
+def make_places(size, city, user):
+    """returns size new places of city owned by user"""
+    return [Place(city_id=city.id, user_id=user.id,
+                  name="place number {}".format(i)) for i in range(size)]
+
+
+def one_by_one(storage, places):
+    """stores places like BaseModel.save() does, one save each"""
+    for place in places:
+        storage.new(place)
+        storage.save()
+
+
+def in_bulk(storage, places):
+    """stores places with one bulk_new and one save"""
+    storage.bulk_new(places)
+    storage.save()
+
+
+def measure(label, store, storage, places):
+    """prints the time store takes to store places"""
+    start = time.perf_counter()
+    store(storage, places)
+    if hasattr(storage, "flush"):
+        storage.flush()
+    elapsed = time.perf_counter() - start
+    print("{:<10} {:>8} places {:>8.2f}s {:>10.0f} places/s".format(
+        label, len(places), elapsed, len(places) / elapsed))
+
+
+if __name__ == "__main__":
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    storage = models.storage
+    with tempfile.TemporaryDirectory() as tmp:
+        if models.storage_t not in ("db", "sqlite"):
+            storage._FileStorage__file_path = os.path.join(tmp, "file.json")
+        state = State(name="Bulk")
+        city = City(name="Bulk", state_id=state.id)
+        user = User(email="bulk@hbnb.io", password="bulk")
+        in_bulk(storage, [state, city, user])
+        print("{} storage".format(models.storage_t or "file"))
+        measure("per object", one_by_one, storage,
+                make_places(size, city, user))
+        measure("bulk", in_bulk, storage, make_places(size, city, user))
@@ -0,0 +1,11 @@
+#!/usr/bin/python3
+"""
+Makes DBStorage over an in-memory SQLite database the default storage of a
+benchmark, unless HBNB_TYPE_STORAGE and HBNB_DB_URL say otherwise; it must
+be imported before models, which reads them once
+"""
+
+import os
+
+os.environ.setdefault("HBNB_TYPE_STORAGE", "db")
+os.environ.setdefault("HBNB_DB_URL", "sqlite:///:memory:")
@@ -0,0 +1,67 @@
+#!/usr/bin/python3
+"""
+Compares the time to build objects from stored records through
+BaseModel.__init__ (a setattr per key and strptime for the timestamps) and
+through BaseModel.from_dict (fromisoformat and one __dict__ update)
+
+Usage: python3 -m benchmarks.hydration [number of records]
+"""
+
+import sys
+import time
+from models.place import Place
+from models.review import Review
+from models.state import State
+
+# records are built from a pool of this many, reused round robin, so that
+# memory stays flat whatever the number of records
+POOL = 10000
+
+
+def make_records(size):
+    """returns size records of a mix of classes, as reload() reads them"""
+    records = []
+    for i in range(size):
+        if i % 3 == 0:
+            obj = State(name="State {}".format(i))
+        elif i % 3 == 1:
+            obj = Place(name="Place {}".format(i), city_id="city",
+                        user_id="user", number_rooms=i % 7,
+                        amenity_ids=["a", "b"])
+        else:
+            obj = Review(text="Review {}".format(i), place_id="place",
+                         user_id="user")
+        records.append((type(obj), obj.to_dict()))
+    return records
+
+
+def init(cls, record):
+    """builds the object of record through __init__"""
+    return cls(**record)
+
+
+def from_dict(cls, record):
+    """builds the object of record through from_dict"""
+    return cls.from_dict(record)
+
+
+def measure(label, build, records, size):
+    """prints the time build takes for size records"""
+    start = time.perf_counter()
+    done = 0
+    while done < size:
+        for cls, record in records[:size - done]:
+            build(cls, record)
+        done += min(len(records), size - done)
+    elapsed = time.perf_counter() - start
+    print("{:<10} {:>9} records {:>8.2f}s {:>10.0f} records/s".format(
+        label, size, elapsed, size / elapsed))
+    return elapsed
+
+
+if __name__ == "__main__":
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    records = make_records(min(size, POOL))
+    slow = measure("__init__", init, records, size)
+    fast = measure("from_dict", from_dict, records, size)
+    print("speedup {:.1f}x".format(slow / fast))
@@ -0,0 +1,74 @@
+#!/usr/bin/python3
+"""
+Compares the time and peak memory of FileStorage.reload() on a large JSON
+file when the file is parsed at once with json.load and when it is
+streamed record by record
+
+Usage: python3 -m benchmarks.reload_memory [number of records]
+"""
+
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from models.engine import file_storage
+from models.review import Review
+
+FileStorage = file_storage.FileStorage
+
+
+def write_file(path, size):
+    """writes a JSON file of size reviews to path"""
+    with open(path, 'w') as f:
+        f.write("{")
+        for i in range(size):
+            review = Review(place_id="place", user_id="user",
+                            text="review number {}".format(i))
+            if i:
+                f.write(", ")
+            f.write(json.dumps("Review." + review.id) + ": " +
+                    json.dumps(review.to_dict()))
+        f.write("}")
+
+
+def load_whole(f, chunk_size=None):
+    """parses all of f at once, as reload() did before it streamed it"""
+    return json.load(f).items()
+
+
+def reload(path):
+    """loads path into an empty FileStorage and returns its objects"""
+    FileStorage._FileStorage__objects = {}
+    storage = FileStorage()
+    storage._FileStorage__file_path = path
+    storage.reload()
+    return FileStorage._FileStorage__objects
+
+
+def measure(label, path):
+    """prints the time, final and peak traced memory of reload(path)"""
+    start = time.perf_counter()
+    reload(path)
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    objects = reload(path)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print("{:<10} {:>8} objects {:>8.2f}s  steady {:>8.1f} MiB  "
+          "peak {:>8.1f} MiB".format(label, len(objects), elapsed,
+                                     current / 2 ** 20, peak / 2 ** 20))
+
+
+if __name__ == "__main__":
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "file.json")
+        write_file(path, size)
+        print("{} ({:.1f} MiB)".format(path, os.path.getsize(path) / 2 ** 20))
+        streaming = file_storage.iter_items
+        file_storage.iter_items = load_whole
+        measure("json.load", path)
+        file_storage.iter_items = streaming
+        measure("streaming", path)
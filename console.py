@@ -96,7 +96,7 @@ class HBNBCommand(cmd.Cmd):
             if len(args) > 1:
                 key = args[0] + "." + args[1]
                 if key in models.storage.all():
-                    models.storage.all().pop(key)
+                    models.storage.delete(models.storage.all()[key])
                     models.storage.save()
                 else:
                     print("** no instance found **")
@@ -108,18 +108,16 @@ class HBNBCommand(cmd.Cmd):
     def do_all(self, arg):
         """Prints string representations of instances"""
         args = shlex.split(arg)
-        obj_list = []
         if len(args) == 0:
-            obj_dict = models.storage.all()
+            objs = models.storage.iter()
         elif args[0] in classes:
-            obj_dict = models.storage.all(classes[args[0]])
+            objs = models.storage.iter(classes[args[0]])
         else:
             print("** class doesn't exist **")
             return False
-        for key in obj_dict:
-            obj_list.append(str(obj_dict[key]))
         print("[", end="")
-        print(", ".join(obj_list), end="")
+        for i, obj in enumerate(objs):
+            print((", " if i else "") + str(obj), end="")
         print("]")
 
     def do_update(self, arg):
@@ -4,6 +4,7 @@ Contains class BaseModel
 """
 
 from datetime import datetime
+import json
 import models
 from os import getenv
 import sqlalchemy
@@ -47,6 +48,39 @@ class BaseModel:
             self.created_at = datetime.now()
             self.updated_at = self.created_at
 
+    if models.storage_t != "db":
+        # the [to_dict() result, JSON text or None] cache is kept in a slot
+        # so that it never shows in __dict__
+        __slots__ = ("__dict__", "__weakref__", "__encoded")
+
+        def __setattr__(self, name, value):
+            """sets an attribute and marks the object as changed in storage"""
+            super().__setattr__(name, value)
+            self.invalidate()
+            models.storage.mark_dirty(self, name)
+
+    def invalidate(self):
+        """drops the cached to_dict() and JSON text of the instance, for
+        changes made in place (such as appending to a list attribute)"""
+        if models.storage_t != "db":
+            object.__setattr__(self, "_BaseModel__encoded", None)
+
+    @classmethod
+    def from_dict(cls, record):
+        """returns the instance of a to_dict() record without going through
+        __init__: the timestamps are parsed with fromisoformat and the
+        attributes set with one __dict__ update, as storage does on reload"""
+        if models.storage_t == "db" or "id" not in record or \
+                "created_at" not in record or "updated_at" not in record:
+            return cls(**record)
+        obj = cls.__new__(cls)
+        attrs = obj.__dict__
+        attrs.update(record)
+        attrs.pop("__class__", None)
+        attrs["created_at"] = datetime.fromisoformat(attrs["created_at"])
+        attrs["updated_at"] = datetime.fromisoformat(attrs["updated_at"])
+        return obj
+
     def __str__(self):
         """String representation of the BaseModel class"""
         return "[{:s}] ({:s}) {}".format(self.__class__.__name__, self.id,
@@ -59,7 +93,11 @@ class BaseModel:
         models.storage.save()
 
     def to_dict(self):
-        """returns a dictionary containing all keys/values of the instance"""
+        """returns a dictionary containing all keys/values of the instance,
+        built once until an attribute is assigned (except in DB mode)"""
+        encoded = getattr(self, "_BaseModel__encoded", None)
+        if encoded is not None:
+            return dict(encoded[0])
         new_dict = self.__dict__.copy()
         if "created_at" in new_dict:
             new_dict["created_at"] = new_dict["created_at"].strftime(time)
@@ -68,8 +106,23 @@ class BaseModel:
         new_dict["__class__"] = self.__class__.__name__
         if "_sa_instance_state" in new_dict:
             del new_dict["_sa_instance_state"]
+        if models.storage_t != "db":
+            object.__setattr__(self, "_BaseModel__encoded",
+                               [dict(new_dict), None])
         return new_dict
 
+    def to_json(self):
+        """returns the JSON text of to_dict(), encoded once until an
+        attribute is assigned (except in DB mode)"""
+        encoded = getattr(self, "_BaseModel__encoded", None)
+        if encoded is not None and encoded[1] is not None:
+            return encoded[1]
+        text = json.dumps(self.to_dict())
+        encoded = getattr(self, "_BaseModel__encoded", None)
+        if encoded is not None:
+            encoded[1] = text
+        return text
+
     def delete(self):
         """delete the current instance from the storage"""
         models.storage.delete(self)
@@ -7,21 +7,203 @@ import models
 from models.amenity import Amenity
 from models.base_model import BaseModel, Base
 from models.city import City
+from models.engine.migrations import migrate
 from models.place import Place
 from models.review import Review
 from models.state import State
 from models.user import User
+from collections import OrderedDict
+from itertools import chain
 from os import getenv
 import sqlalchemy
-from sqlalchemy import create_engine
-from sqlalchemy.orm import scoped_session, sessionmaker
+from sqlalchemy import and_, create_engine, event, func, insert, literal, \
+    or_, select, union_all
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import joinedload, make_transient_to_detached, \
+    scoped_session, selectinload, sessionmaker
+from sqlalchemy.pool import StaticPool
+import threading
+import time
 
 classes = {"Amenity": Amenity, "City": City,
            "Place": Place, "Review": Review, "State": State, "User": User}
 
+# create_engine arguments set by each HBNB_DB_POOL_* variable
+pool_settings = {"SIZE": ("pool_size", int),
+                 "MAX_OVERFLOW": ("max_overflow", int),
+                 "TIMEOUT": ("pool_timeout", float),
+                 "RECYCLE": ("pool_recycle", int),
+                 "PRE_PING": ("pool_pre_ping",
+                              lambda value: value.lower() in ("1", "true"))}
+
+
+def pool_options():
+    """returns the create_engine pool arguments of the HBNB_DB_POOL_*
+    variables that are set"""
+    options = {}
+    for name, (argument, kind) in pool_settings.items():
+        value = getenv("HBNB_DB_POOL_" + name)
+        if value:
+            options[argument] = kind(value)
+    return options
+
+
+# relationship loading strategies of load_options, by name
+strategies = {"selectin": selectinload, "joined": joinedload}
+
+
+def load_options(cls, load):
+    """returns the query options eager loading the relationships of cls
+    named in load: a name, a list of names (loaded with selectin) or a
+    dictionary {name: "selectin" or "joined"}; a dotted name such as
+    "places.reviews" loads a relationship of the related objects too"""
+    if isinstance(load, str):
+        load = [load]
+    if not isinstance(load, dict):
+        load = dict.fromkeys(load, "selectin")
+    options = []
+    for path, strategy in load.items():
+        option = None
+        owner = cls
+        for name in path.split("."):
+            attr = getattr(owner, name)
+            if option is None:
+                option = strategies[strategy](attr)
+            else:
+                option = getattr(option, strategy + "load")(attr)
+            owner = attr.property.mapper.class_
+        options.append(option)
+    return options
+
+
+class PoolMonitor:
+    """times and counts the checkouts of the connections of a pool"""
+
+    def __init__(self, pool):
+        """Instruments pool"""
+        self.pool = pool
+        self.__lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.in_use = 0
+        self.max_in_use = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        event.listen(pool, "checkout", self.__checkout)
+        event.listen(pool, "checkin", self.__checkin)
+        connect = pool.connect
+
+        def timed_connect():
+            """checks out a connection, timing the wait for it"""
+            start = time.perf_counter()
+            try:
+                return connect()
+            except sqlalchemy.exc.TimeoutError:
+                with self.__lock:
+                    self.timeouts += 1
+                raise
+            finally:
+                wait = time.perf_counter() - start
+                with self.__lock:
+                    self.wait_total += wait
+                    self.wait_max = max(self.wait_max, wait)
+        pool.connect = timed_connect
+
+    def __checkout(self, dbapi_connection, record, proxy):
+        """counts a connection handed out by the pool"""
+        with self.__lock:
+            self.checkouts += 1
+            self.in_use += 1
+            self.max_in_use = max(self.max_in_use, self.in_use)
+
+    def __checkin(self, dbapi_connection, record):
+        """counts a connection given back to the pool"""
+        with self.__lock:
+            self.in_use -= 1
+
+    def stats(self):
+        """returns the pool counters as a dictionary"""
+        with self.__lock:
+            stats = {"checkouts": self.checkouts,
+                     "timeouts": self.timeouts,
+                     "in_use": self.in_use,
+                     "max_in_use": self.max_in_use,
+                     "wait_total": self.wait_total,
+                     "wait_max": self.wait_max,
+                     "wait_avg": self.wait_total / self.checkouts
+                     if self.checkouts else 0.0}
+        for name in ("size", "overflow", "checkedin"):
+            if hasattr(self.pool, name):
+                stats[name] = getattr(self.pool, name)()
+        return stats
+
+
+class ObjectCache:
+    """a least recently used cache of the column values of objects, by
+    <class name>.id, whose entries expire ttl seconds after being stored"""
+
+    def __init__(self, max_size, ttl=None):
+        """Instantiate a cache of at most max_size entries"""
+        self.max_size = max_size
+        self.ttl = ttl
+        self.__entries = OrderedDict()
+        self.__lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        """returns the values cached for key, None if there are none"""
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is not None and entry[1] is not None and \
+                    entry[1] <= time.monotonic():
+                del self.__entries[key]
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.__entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, values):
+        """caches values for key, evicting the least recently used entry
+        when the cache is full"""
+        expires = None if self.ttl is None else time.monotonic() + self.ttl
+        with self.__lock:
+            self.__entries[key] = (values, expires)
+            self.__entries.move_to_end(key)
+            while len(self.__entries) > self.max_size:
+                self.__entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, keys):
+        """drops the entries of keys"""
+        with self.__lock:
+            for key in keys:
+                self.__entries.pop(key, None)
+
+    def clear(self):
+        """drops every entry"""
+        with self.__lock:
+            self.__entries.clear()
+
+    def stats(self):
+        """returns the cache counters as a dictionary"""
+        with self.__lock:
+            return {"hits": self.hits, "misses": self.misses,
+                    "evictions": self.evictions,
+                    "expirations": self.expirations,
+                    "size": len(self.__entries),
+                    "max_size": self.max_size}
+
 
 class DBStorage:
-    """interaacts with the MySQL database"""
+    """interaacts with the MySQL database, or with the database of the
+    SQLAlchemy URL in HBNB_DB_URL when it is set"""
     __engine = None
     __session = None
 
@@ -32,28 +214,84 @@ class DBStorage:
         HBNB_MYSQL_HOST = getenv('HBNB_MYSQL_HOST')
         HBNB_MYSQL_DB = getenv('HBNB_MYSQL_DB')
         HBNB_ENV = getenv('HBNB_ENV')
-        self.__engine = create_engine('mysql+mysqldb://{}:{}@{}/{}'.
-                                      format(HBNB_MYSQL_USER,
-                                             HBNB_MYSQL_PWD,
-                                             HBNB_MYSQL_HOST,
-                                             HBNB_MYSQL_DB))
+        HBNB_DB_URL = getenv('HBNB_DB_URL')
+        if HBNB_DB_URL:
+            url = make_url(HBNB_DB_URL)
+        else:
+            url = 'mysql+mysqldb://{}:{}@{}/{}'.format(HBNB_MYSQL_USER,
+                                                       HBNB_MYSQL_PWD,
+                                                       HBNB_MYSQL_HOST,
+                                                       HBNB_MYSQL_DB)
+        if HBNB_DB_URL and url.get_backend_name() == "sqlite" and \
+                url.database in (None, "", ":memory:"):
+            # a single connection shared by every thread, or each
+            # connection would see its own empty database
+            self.__engine = create_engine(
+                url, poolclass=StaticPool,
+                connect_args={"check_same_thread": False})
+        else:
+            self.__engine = create_engine(url, **pool_options())
+        self.__monitor = PoolMonitor(self.__engine.pool)
+        HBNB_DB_CACHE_SIZE = int(getenv('HBNB_DB_CACHE_SIZE', 0))
+        HBNB_DB_CACHE_TTL = getenv('HBNB_DB_CACHE_TTL')
+        self.__cache = None
+        if HBNB_DB_CACHE_SIZE > 0:
+            self.__cache = ObjectCache(HBNB_DB_CACHE_SIZE,
+                                       float(HBNB_DB_CACHE_TTL)
+                                       if HBNB_DB_CACHE_TTL else None)
         if HBNB_ENV == "test":
             Base.metadata.drop_all(self.__engine)
 
-    def all(self, cls=None):
-        """query on the current database session"""
+    def all(self, cls=None, load=None):
+        """query on the current database session, eager loading the
+        relationships of cls named in load (see load_options)"""
         new_dict = {}
         for clss in classes:
             if cls is None or cls is classes[clss] or cls is clss:
-                objs = self.__session.query(classes[clss]).all()
+                query = self.__session.query(classes[clss])
+                if load and cls is not None:
+                    query = query.options(*load_options(classes[clss],
+                                                        load))
+                objs = query.all()
                 for obj in objs:
                     key = obj.__class__.__name__ + '.' + obj.id
                     new_dict[key] = obj
         return (new_dict)
 
+    def iter(self, cls=None, batch_size=1000):
+        """yields the objects of cls (or of every class), streaming the
+        rows batch_size at a time through a server-side cursor"""
+        for clss in classes:
+            if cls is None or cls is classes[clss] or cls is clss:
+                query = self.__session.query(classes[clss])
+                for obj in query.yield_per(batch_size):
+                    yield obj
+
     def new(self, obj):
         """add the object to the current database session"""
         self.__session.add(obj)
+        if self.__cache is not None:
+            self.__cache.invalidate([obj.__class__.__name__ + "." + obj.id])
+
+    def bulk_new(self, objs):
+        """inserts the rows of objs in the current transaction with one
+        executemany INSERT per class, committed by the next save(); the
+        objects are not added to the session, so only their columns are
+        written (not their relationships) and get() loads new instances"""
+        rows = {}
+        for obj in objs:
+            cls = obj.__class__
+            rows.setdefault(cls, []).append(
+                {attr.key: getattr(obj, attr.key) for attr in
+                 sqlalchemy.inspect(cls).column_attrs})
+        # parents first, so the foreign keys of their children hold
+        order = Base.metadata.sorted_tables
+        for cls in sorted(rows, key=lambda cls: order.index(cls.__table__)):
+            values = rows[cls]
+            self.__session.execute(insert(cls), values)
+            if self.__cache is not None:
+                self.__cache.invalidate([cls.__name__ + "." + row["id"]
+                                         for row in values])
 
     def save(self):
         """commit all changes of the current database session"""
@@ -63,36 +301,135 @@ class DBStorage:
         """delete from the current database session obj if not None"""
         if obj is not None:
             self.__session.delete(obj)
+            if self.__cache is not None:
+                self.__cache.invalidate([obj.__class__.__name__ + "." +
+                                         obj.id])
 
     def reload(self):
         """reloads data from the database"""
         Base.metadata.create_all(self.__engine)
+        migrate(self.__engine)
         sess_factory = sessionmaker(bind=self.__engine, expire_on_commit=False)
+        if self.__cache is not None:
+            event.listen(sess_factory, "after_flush", self.__flushed)
+            event.listen(sess_factory, "after_commit", self.__committed)
+            event.listen(sess_factory, "after_rollback", self.__rolled_back)
         Session = scoped_session(sess_factory)
         self.__session = Session
 
+    def __flushed(self, session, flush_context):
+        """drops the cached values of the objects written by a flush and
+        remembers them to drop them again once the transaction commits,
+        in case another session cached them in between"""
+        keys = {obj.__class__.__name__ + "." + obj.id for obj in
+                chain(session.new, session.dirty, session.deleted)}
+        session.info.setdefault("hbnb_written", set()).update(keys)
+        self.__cache.invalidate(keys)
+
+    def __committed(self, session):
+        """drops the cached values of the objects the commit wrote"""
+        self.__cache.invalidate(session.info.pop("hbnb_written", ()))
+
+    def __rolled_back(self, session):
+        """forgets the objects written by a rolled back transaction"""
+        session.info.pop("hbnb_written", None)
+
+    def cache_stats(self):
+        """returns the counters of the object cache, None if it is off"""
+        if self.__cache is None:
+            return None
+        return self.__cache.stats()
+
     def close(self):
         """call remove() method on the private session attribute"""
         self.__session.remove()
 
+    def pool_stats(self):
+        """returns the checkout counters of the connection pool"""
+        return self.__monitor.stats()
+
     def get(self, cls, obj_id):
         """ Retrieves an object """
         if not cls or not obj_id:
             return None
-
-        from models import storage
-
-        cls_objs = storage.all(cls)
-        if not cls_objs:
+        if type(cls) is str:
+            cls = classes.get(cls)
+        if cls not in classes.values():
             return None
-
-        obj_key = "{}.{}".format(cls.__name__, obj_id)
-        obj = cls_objs.get(obj_key)
-
+        if self.__cache is None:
+            return self.__session.get(cls, obj_id)
+        key = cls.__name__ + "." + obj_id
+        obj = self.__session.identity_map.get(
+            self.__session.identity_key(cls, obj_id))
+        if obj is not None:
+            return obj
+        values = self.__cache.get(key)
+        if values is not None:
+            # a detached copy merged without a query, so that each session
+            # gets its own instance
+            obj = sqlalchemy.inspect(cls).class_manager.new_instance()
+            for name, value in values.items():
+                setattr(obj, name, value)
+            make_transient_to_detached(obj)
+            return self.__session.merge(obj, load=False)
+        obj = self.__session.get(cls, obj_id)
+        if obj is not None:
+            state = sqlalchemy.inspect(obj)
+            self.__cache.put(key, {attr.key: state.dict.get(attr.key)
+                                   for attr in state.mapper.column_attrs})
         return obj
 
+    def filter(self, cls, order_by=None, limit=None, offset=0, after=None,
+               load=None, **equals):
+        """returns the list of objects of cls whose columns equal the values
+        in equals, in a single WHERE / ORDER BY / LIMIT query; a leading
+        '-' in an order_by column sorts it in descending order, after
+        holds the order_by values the rows must follow (keyset paging) and
+        load names the relationships to eager load (see load_options)"""
+        if type(cls) is str:
+            cls = classes[cls]
+        query = self.__session.query(cls).filter_by(**equals)
+        if load:
+            query = query.options(*load_options(cls, load))
+        if isinstance(order_by, str):
+            order_by = [order_by]
+        if after is not None:
+            terms = []
+            for i, attr in enumerate(order_by[:len(after)]):
+                column = getattr(cls, attr.lstrip("-"))
+                past = column < after[i] if attr.startswith("-") \
+                    else column > after[i]
+                terms.append(and_(*[getattr(cls, a.lstrip("-")) == v
+                                    for a, v in zip(order_by, after[:i])],
+                                  past))
+            query = query.filter(or_(*terms))
+        if order_by:
+            for attr in order_by:
+                column = getattr(cls, attr.lstrip("-"))
+                query = query.order_by(column.desc() if attr.startswith("-")
+                                       else column.asc())
+        if offset:
+            query = query.offset(offset)
+        if limit is not None:
+            query = query.limit(limit)
+        return query.all()
+
     def count(self, cls=None):
         """ Returns the number of objects in storage """
-        from models import storage
-        objs = storage.all(cls)
-        return len(objs)
+        if cls is None:
+            return sum(self.counts().values())
+        if type(cls) is not str:
+            cls = cls.__name__
+        if cls not in classes:
+            return 0
+        return self.counts(cls)[cls]
+
+    def counts(self, *clss):
+        """returns {class name: number of rows} for the classes clss (or
+        every class), counted by a single UNION ALL of SELECT COUNT(*)"""
+        names = [cls if type(cls) is str else cls.__name__ for cls in clss]
+        selects = [select(literal(name), func.count()).select_from(
+            classes[name]) for name in names or classes]
+        query = selects[0] if len(selects) == 1 else union_all(*selects)
+        self.__session.flush()
+        return dict(self.__session.execute(query).all())
@@ -3,7 +3,10 @@
 Contains the FileStorage class
 """
 
+import atexit
+from datetime import datetime, timedelta
 import json
+import logging
 from models.amenity import Amenity
 from models.base_model import BaseModel
 from models.city import City
@@ -11,59 +14,789 @@ from models.place import Place
 from models.review import Review
 from models.state import State
 from models.user import User
+import os
+import re
+import sys
+import threading
+import time
 
+logger = logging.getLogger(__name__)
 classes = {"Amenity": Amenity, "BaseModel": BaseModel, "City": City,
            "Place": Place, "Review": Review, "State": State, "User": User}
+# file of each class in the sharded layout, by class name
+shards = {"Amenity": "amenities.json", "BaseModel": "base_models.json",
+          "City": "cities.json", "Place": "places.json",
+          "Review": "reviews.json", "State": "states.json",
+          "User": "users.json"}
+# foreign keys kept in reverse indexes, by class name
+foreign_keys = {"City": ("state_id",), "Place": ("city_id", "user_id"),
+                "Review": ("place_id", "user_id")}
+
+
+def stat(path):
+    """returns the mtime, size and inode of the file at path, or None"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+def order_objects(objs, order_by):
+    """sorts the list objs by the attribute name or names in order_by, a
+    leading '-' sorting that attribute in descending order"""
+    if isinstance(order_by, str):
+        order_by = [order_by]
+    for attr in reversed(order_by):
+        descending = attr.startswith("-")
+        attr = attr.lstrip("-")
+        objs.sort(key=lambda obj: getattr(obj, attr, None),
+                  reverse=descending)
+    return objs
+
+
+def follows(obj, order_by, after):
+    """returns True if obj sorts strictly after the row whose values of
+    the order_by attributes are after, a keyset pagination cursor"""
+    if isinstance(order_by, str):
+        order_by = [order_by]
+    for attr, value in zip(order_by, after):
+        mine = getattr(obj, attr.lstrip("-"), None)
+        if mine != value:
+            return mine < value if attr.startswith("-") else mine > value
+    return False
+
+
+# the timestamps of compact records are microseconds since epoch
+epoch = datetime(1970, 1, 1)
+microsecond = timedelta(microseconds=1)
+timestamps = ("created_at", "updated_at")
+# the attribute names of compact records, one shared tuple per layout
+layouts = {}
+
+
+def pack(record):
+    """returns the compact form of a to_dict() record: a tuple of the
+    shared tuple of its attribute names followed by their values, with the
+    ids interned and the timestamps as integers; the record itself is
+    returned if its timestamps are not in the format to_dict() writes"""
+    fields = tuple(record)
+    fields = layouts.setdefault(fields, fields)
+    values = [fields]
+    for field in fields:
+        value = record[field]
+        if field in timestamps:
+            if type(value) is not str or len(value) != 26 or \
+                    value[19] != ".":
+                return record
+            value = (datetime.fromisoformat(value) - epoch) // microsecond
+        elif type(value) is str and (field in ("id", "__class__") or
+                                     field.endswith("_id")):
+            value = sys.intern(value)
+        values.append(value)
+    return tuple(values)
+
+
+def unpack(record):
+    """returns the to_dict() record of a record kept by pack()"""
+    if type(record) is dict:
+        return record
+    record = dict(zip(record[0], record[1:]))
+    for field in timestamps:
+        record[field] = (epoch + record[field] * microsecond).isoformat(
+            timespec="microseconds")
+    return record
+
+
+def size_of(value, seen):
+    """returns the approximate size in bytes of value and of what it holds,
+    skipping the objects whose id is in seen (shared strings are counted
+    once) and adding the others to it"""
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    size = sys.getsizeof(value)
+    if isinstance(value, BaseModel):
+        size += size_of(value.__dict__, seen)
+        size += size_of(getattr(value, "_BaseModel__encoded", None), seen)
+    elif type(value) is dict:
+        for key, item in value.items():
+            size += size_of(key, seen) + size_of(item, seen)
+    elif type(value) in (list, tuple):
+        for item in value:
+            size += size_of(item, seen)
+    return size
+
+
+# whitespace allowed between JSON tokens
+whitespace = re.compile(r'[ \t\n\r]*')
+
+
+def iter_items(f, chunk_size=65536):
+    """yields the (key, value) pairs of the JSON object in file f one by
+    one, reading it chunk by chunk instead of parsing it all at once"""
+    decoder = json.JSONDecoder()
+    buf = ""
+    pos = 0
+    eof = False
+    started = False
+    while True:
+        pos = whitespace.match(buf, pos).end()
+        if pos < len(buf):
+            char = buf[pos]
+            if not started:
+                if char != "{":
+                    raise ValueError("the JSON file is not an object")
+                started = True
+                pos += 1
+                continue
+            if char == "}":
+                return
+            if char == ",":
+                pos += 1
+                continue
+            try:
+                key, end = decoder.raw_decode(buf, pos)
+                end = whitespace.match(buf, end).end()
+                if buf[end] != ":":
+                    raise ValueError("expecting ':' in the JSON file")
+                end = whitespace.match(buf, end + 1).end()
+                value, end = decoder.raw_decode(buf, end)
+            except (ValueError, IndexError):
+                # the pair may only be cut by the end of the chunk
+                if eof:
+                    raise
+            else:
+                yield key, value
+                pos = end
+                continue
+        if eof:
+            raise ValueError("unexpected end of the JSON file")
+        chunk = f.read(chunk_size)
+        eof = not chunk
+        buf = buf[pos:] + chunk
+        pos = 0
 
 
 class FileStorage:
-    """serializes instances to a JSON file & deserializes back to instances"""
+    """serializes instances to a JSON file & deserializes back to instances
+
+    Changes are serialized by a lock while reads never wait: all(cls),
+    get() and count() only take atomic copies or lookups, and the
+    dictionary all() returns is never changed afterwards (the next change
+    works on a copy), so it can be iterated while other threads write.
+    """
 
     # string - path to the JSON file
     __file_path = "file.json"
     # dictionary - empty but will store all objects by <class name>.id
     __objects = {}
+    # dictionary - per-class buckets of __objects by <class name>
+    __classes = {}
+    # dictionary - reverse indexes of foreign_keys: <class name>.<attribute>
+    # mapped to {<attribute value>: {<class name>.id: object}}
+    __refs = {}
+    # dictionary - <class name>.id mapped to the indexed foreign key values
+    __ref_values = {}
+    # dictionary - records loaded but not turned into objects yet (lazy
+    # mode), by <class name> then <class name>.id
+    __records = {}
+    # set - classes whose shard changed on disk and is not parsed yet
+    __pending = set()
+    # tuple - the __objects dictionary and the stat of each shard as last
+    # loaded or saved, by <class name> (sharded mode)
+    __shards_loaded = (None, {})
+    # dictionary - the __objects dictionary the indexes were built from
+    __indexed = None
+    # dictionary - <class name>.id of objects changed since the last save,
+    # mapped to the object, or to None if the object was deleted
+    __changes = {}
+    # dictionary - <class name>.id mapped to (record, JSON text) of the
+    # records not built yet (lazy mode), objects cache their own JSON text
+    __encoded = {}
+    # tuple - the __objects dictionary and the stat of the files it was last
+    # loaded from or saved to, used to skip reloading unchanged files
+    __loaded = (None, None)
+    # lock - held while the objects are written to the files or changed
+    __lock = threading.RLock()
+    # boolean - True once all() handed __objects out; it is then copied
+    # before the next change so that callers can iterate it safely
+    __shared = False
+    # lock - held for the instant __shared is checked and __objects read
+    # or changed, so all() never hands out a dictionary being changed
+    __share_lock = threading.Lock()
+
+    def __init__(self):
+        """Instantiate a FileStorage object
+
+        HBNB_FILE_MODE=journal appends each change to <file>.journal on
+        save() instead of rewriting the whole JSON file; the journal is
+        folded back into the JSON file once it grows past
+        HBNB_FILE_JOURNAL_MAX bytes.
+
+        HBNB_FILE_MODE=sharded keeps one JSON file per class in the
+        <file>_shards directory (see shards); save() only rewrites the files
+        of classes that changed and reload() parses a file the first time
+        its class is needed.
+
+        HBNB_FILE_LAZY=1 makes reload() keep the records it reads and only
+        build an object the first time get(), all() or related() needs it.
+        HBNB_FILE_COMPACT=1 does the same but keeps the records packed (see
+        pack), so that the objects built from them share their id strings.
+
+        HBNB_FILE_FLUSH_INTERVAL=<seconds> makes save() return at once and
+        leaves the writing to a background thread, which flushes every
+        <seconds> or as soon as HBNB_FILE_FLUSH_BATCH saves are waiting.
+        HBNB_FILE_DURABILITY=fsync makes every save() write and fsync the
+        files before returning, whatever the flush interval.
+        """
+        self.__mode = os.getenv("HBNB_FILE_MODE", "snapshot")
+        self.__journal_max = int(os.getenv("HBNB_FILE_JOURNAL_MAX",
+                                           4 * 1024 * 1024))
+        self.__packed = os.getenv("HBNB_FILE_COMPACT") == "1"
+        self.__lazy = os.getenv("HBNB_FILE_LAZY") == "1" or self.__packed
+        self.__flush_interval = float(os.getenv("HBNB_FILE_FLUSH_INTERVAL",
+                                                0))
+        self.__flush_batch = int(os.getenv("HBNB_FILE_FLUSH_BATCH", 100))
+        self.__durability = os.getenv("HBNB_FILE_DURABILITY", "")
+        # number of save() calls waiting for the background flusher
+        self.__saves = 0
+        self.__flush_wanted = threading.Condition(FileStorage.__lock)
+        self.__flusher = None
+
+    def __buckets(self):
+        """returns the per-class index, rebuilt if __objects was replaced"""
+        if FileStorage.__indexed is not FileStorage.__objects:
+            FileStorage.__classes = {}
+            FileStorage.__refs = {}
+            FileStorage.__ref_values = {}
+            FileStorage.__records = {}
+            FileStorage.__pending = set()
+            FileStorage.__indexed = FileStorage.__objects
+            for key, value in FileStorage.__objects.items():
+                self.__index(key, value)
+        return FileStorage.__classes
+
+    def __bucket(self, cls):
+        """returns the bucket of objects of class cls (name or class)"""
+        if type(cls) is not str:
+            cls = cls.__name__
+        return self.__buckets().get(cls, {})
+
+    def __index(self, key, obj):
+        """adds obj to its class bucket and foreign key indexes"""
+        name = obj.__class__.__name__
+        FileStorage.__classes.setdefault(name, {})[key] = obj
+        if name in foreign_keys:
+            self.__index_refs(key, obj)
+
+    def __index_refs(self, key, obj):
+        """(re)indexes obj under the current values of its foreign keys"""
+        self.__unindex_refs(key)
+        name = obj.__class__.__name__
+        values = {}
+        for attr in foreign_keys[name]:
+            value = getattr(obj, attr, None)
+            values[attr] = value
+            refs = FileStorage.__refs.setdefault(name + "." + attr, {})
+            refs.setdefault(value, {})[key] = obj
+        FileStorage.__ref_values[key] = values
+
+    def __unindex_refs(self, key):
+        """removes key from the foreign key indexes"""
+        values = FileStorage.__ref_values.pop(key, None)
+        if values is None:
+            return
+        name = key.split(".", 1)[0]
+        for attr, value in values.items():
+            refs = FileStorage.__refs[name + "." + attr]
+            refs[value].pop(key, None)
+            if not refs[value]:
+                del refs[value]
+
+    def __writable(self):
+        """returns __objects, replaced by a copy if all() handed it out"""
+        objects = FileStorage.__objects
+        if FileStorage.__shared:
+            FileStorage.__shared = False
+            FileStorage.__objects = dict(objects)
+            # the copy holds the same objects as the original
+            if FileStorage.__indexed is objects:
+                FileStorage.__indexed = FileStorage.__objects
+            if FileStorage.__loaded[0] is objects:
+                FileStorage.__loaded = (FileStorage.__objects,
+                                        FileStorage.__loaded[1])
+            if FileStorage.__shards_loaded[0] is objects:
+                FileStorage.__shards_loaded = (FileStorage.__objects,
+                                               FileStorage.__shards_loaded[1])
+        return FileStorage.__objects
+
+    def __put(self, key, obj):
+        """stores obj under key in __objects and in the indexes"""
+        self.__buckets()
+        FileStorage.__records.get(key.split(".", 1)[0], {}).pop(key, None)
+        # obj caches its own JSON text, the record's is not needed anymore
+        FileStorage.__encoded.pop(key, None)
+        with FileStorage.__share_lock:
+            self.__writable()[key] = obj
+        self.__index(key, obj)
+
+    def __pop(self, key):
+        """removes key from __objects and from the indexes"""
+        buckets = self.__buckets()
+        FileStorage.__records.get(key.split(".", 1)[0], {}).pop(key, None)
+        FileStorage.__encoded.pop(key, None)
+        with FileStorage.__share_lock:
+            obj = self.__writable().pop(key, None)
+        if obj is not None:
+            buckets.get(obj.__class__.__name__, {}).pop(key, None)
+            self.__unindex_refs(key)
+        return obj
+
+    def __require(self, cls=None, build=True):
+        """makes the objects of cls (or of every class) available"""
+        if FileStorage.__pending or build and FileStorage.__records:
+            with FileStorage.__lock:
+                if FileStorage.__pending:
+                    self.__load_shards(cls)
+                if build and FileStorage.__records:
+                    self.__hydrate(cls)
+
+    def __hydrate(self, cls=None, keys=None):
+        """builds the objects of the records of cls (or of every class),
+        only those of keys when given"""
+        self.__buckets()
+        if cls is None:
+            names = list(FileStorage.__records)
+        else:
+            names = [cls if type(cls) is str else cls.__name__]
+        for name in names:
+            if keys is None:
+                records = FileStorage.__records.pop(name, None)
+            else:
+                pending = FileStorage.__records.get(name, {})
+                records = {key: pending[key] for key in keys
+                           if key in pending}
+            if records:
+                for key, record in records.items():
+                    self.__put(key, classes[name].from_dict(unpack(record)))
+            if not FileStorage.__records.get(name, True):
+                del FileStorage.__records[name]
 
-    def all(self, cls=None):
-        """returns the dictionary __objects"""
+    def related(self, cls, attr, value):
+        """returns the objects of cls whose foreign key attr equals value"""
+        if type(cls) is not str:
+            cls = cls.__name__
+        self.__require(cls)
+        if attr not in foreign_keys.get(cls, ()):
+            return {k: v for k, v in dict(self.__bucket(cls)).items()
+                    if getattr(v, attr, None) == value}
+        self.__buckets()
+        return dict(FileStorage.__refs.get(cls + "." + attr, {})
+                    .get(value, {}))
+
+    def filter(self, cls, order_by=None, limit=None, offset=0, after=None,
+               load=None, **equals):
+        """returns the list of objects of cls whose attributes equal the
+        values in equals, sorted by order_by (see order_objects) and sliced
+        by offset and limit; after is a keyset cursor, the values of the
+        order_by attributes the results must follow (see follows); the
+        narrowest foreign key index is used when one of the attributes is
+        indexed; load is ignored as relationships are index lookups"""
+        if type(cls) is not str:
+            cls = cls.__name__
+        if "id" in equals:
+            obj = self.get(cls, equals["id"])
+            candidates = [obj] if obj is not None else []
+        else:
+            candidates = None
+            for attr in foreign_keys.get(cls, ()):
+                if attr in equals:
+                    found = list(self.related(cls, attr,
+                                              equals[attr]).values())
+                    if candidates is None or len(found) < len(candidates):
+                        candidates = found
+            if candidates is None:
+                candidates = list(self.all(cls).values())
+        objs = [obj for obj in candidates
+                if all(getattr(obj, attr, None) == value
+                       for attr, value in equals.items())]
+        if after is not None:
+            objs = [obj for obj in objs if follows(obj, order_by, after)]
+        if order_by:
+            order_objects(objs, order_by)
+        if limit is None:
+            return objs[offset:]
+        return objs[offset:offset + limit]
+
+    def all(self, cls=None, load=None):
+        """returns the dictionary __objects; load (the relationships that
+        DBStorage eager loads) is ignored as relationships are index
+        lookups here"""
+        self.__require(cls)
         if cls is not None:
-            new_dict = {}
-            for key, value in self.__objects.items():
-                if cls == value.__class__ or cls == value.__class__.__name__:
-                    new_dict[key] = value
-            return new_dict
-        return self.__objects
+            return dict(self.__bucket(cls))
+        with FileStorage.__share_lock:
+            FileStorage.__shared = True
+            return self.__objects
+
+    def iter(self, cls=None, batch_size=1000):
+        """yields the objects of cls (or of every class), building the
+        lazily loaded ones batch_size at a time instead of all at once"""
+        if cls is not None and type(cls) is not str:
+            cls = cls.__name__
+        self.__require(cls, build=False)
+        for name in classes if cls is None else [cls]:
+            keys = list(self.__bucket(name)) + \
+                list(FileStorage.__records.get(name, {}))
+            for start in range(0, len(keys), batch_size):
+                batch = keys[start:start + batch_size]
+                if FileStorage.__records.get(name):
+                    with FileStorage.__lock:
+                        self.__hydrate(name, batch)
+                for key in batch:
+                    obj = self.__objects.get(key)
+                    if obj is not None:
+                        yield obj
 
     def new(self, obj):
         """sets in __objects the obj with key <obj class name>.id"""
         if obj is not None:
             key = obj.__class__.__name__ + "." + obj.id
-            self.__objects[key] = obj
+            with FileStorage.__lock:
+                self.__put(key, obj)
+                FileStorage.__changes[key] = obj
+
+    def bulk_new(self, objs):
+        """sets in __objects every object of objs in one pass, to be
+        written by the next save() like new() objects"""
+        objs = {obj.__class__.__name__ + "." + obj.id: obj for obj in objs}
+        with FileStorage.__lock:
+            self.__buckets()
+            for key in objs:
+                FileStorage.__records.get(key.split(".", 1)[0],
+                                          {}).pop(key, None)
+                FileStorage.__encoded.pop(key, None)
+            with FileStorage.__share_lock:
+                self.__writable().update(objs)
+            for key, obj in objs.items():
+                self.__index(key, obj)
+            FileStorage.__changes.update(objs)
+
+    def mark_dirty(self, obj, attr=None):
+        """records that obj changed if it is the object stored for its key"""
+        obj_id = obj.__dict__.get("id")
+        if obj_id is None:
+            return
+        name = obj.__class__.__name__
+        key = name + "." + obj_id
+        if self.__objects.get(key) is obj:
+            with FileStorage.__lock:
+                FileStorage.__changes[key] = obj
+                if attr in foreign_keys.get(name, ()):
+                    self.__buckets()
+                    self.__index_refs(key, obj)
+
+    def __encode(self, key, obj):
+        """returns the JSON text of obj, cached by the object itself and
+        re-encoded only if it changed"""
+        if key in FileStorage.__changes:
+            # new() and mark_dirty() also cover changes made in place
+            obj.invalidate()
+        return obj.to_json()
 
     def save(self):
         """serializes __objects to the JSON file (path: __file_path)"""
-        json_objects = {}
-        for key in self.__objects:
-            json_objects[key] = self.__objects[key].to_dict()
-        with open(self.__file_path, 'w') as f:
-            json.dump(json_objects, f)
+        if self.__flush_interval <= 0 or self.__durability == "fsync":
+            self.flush()
+            return
+        with self.__flush_wanted:
+            self.__saves += 1
+            if self.__flusher is None:
+                atexit.register(self.__flush_at_exit)
+            if self.__flusher is None or not self.__flusher.is_alive():
+                self.__flusher = threading.Thread(target=self.__flush_loop,
+                                                  daemon=True)
+                self.__flusher.start()
+            if self.__saves >= self.__flush_batch:
+                self.__flush_wanted.notify()
+
+    def __flush_loop(self):
+        """flushes the saved changes in the background (write-behind); a
+        flush that fails is logged and tried again one interval later"""
+        while self.__flush_interval > 0:
+            failed = False
+            with self.__flush_wanted:
+                self.__flush_wanted.wait_for(
+                    lambda: self.__saves >= self.__flush_batch,
+                    self.__flush_interval)
+                saves = self.__saves
+                if saves:
+                    try:
+                        self.flush()
+                    except Exception:
+                        logger.exception("could not write %s, retrying in "
+                                         "%ss", self.__file_path,
+                                         self.__flush_interval)
+                        # the changes are kept, so are the saves to flush
+                        self.__saves = saves
+                        failed = True
+            if failed:
+                time.sleep(self.__flush_interval)
+
+    def __flush_at_exit(self):
+        """flushes the saves the background flusher did not write yet"""
+        if self.__saves:
+            self.flush()
+
+    def flush(self):
+        """writes the changes of every save() so far to the files"""
+        with FileStorage.__lock:
+            self.__saves = 0
+            if self.__mode == "journal":
+                up_to_date = self.__is_loaded()
+                self.__append_journal()
+            elif self.__mode == "sharded":
+                up_to_date = False
+                self.__write_shards()
+            else:
+                up_to_date = True
+                self.__write_snapshot(self.__file_path)
+            FileStorage.__changes = {}
+            if up_to_date:
+                self.__mark_loaded()
+
+    def __sync(self, f):
+        """forces the content of file f to disk if durability is fsync"""
+        if self.__durability == "fsync":
+            f.flush()
+            os.fsync(f.fileno())
+
+    def __stat(self):
+        """returns the mtime, size and inode of the files reload() reads"""
+        paths = [self.__file_path]
+        if self.__mode == "journal":
+            paths.append(self.__journal_path())
+        return tuple([self.__file_path] + [stat(path) for path in paths])
+
+    def __is_loaded(self):
+        """tells if __objects already reflects the files on disk"""
+        objects, stats = FileStorage.__loaded
+        return objects is self.__objects and stats == self.__stat()
+
+    def __mark_loaded(self):
+        """records that __objects reflects the files as they are now"""
+        FileStorage.__loaded = (self.__objects, self.__stat())
+
+    def __write_snapshot(self, path, cls=None):
+        """writes the objects of cls (or every object) to the file at path,
+        through a temporary file that replaces it once written (and synced
+        if durability is fsync), so that a crash never leaves it truncated"""
+        parts = []
+        if cls is None:
+            objects = self.__objects
+            all_records = FileStorage.__records.values()
+        else:
+            objects = self.__buckets().get(cls, {})
+            all_records = [FileStorage.__records.get(cls, {})]
+        for key, obj in objects.items():
+            parts.append(json.dumps(key) + ": " + self.__encode(key, obj))
+        for records in all_records:
+            for key, record in records.items():
+                if type(record) is not dict:
+                    # not cached, the text would outweigh the packed record
+                    parts.append(json.dumps(key) + ": " +
+                                 json.dumps(unpack(record)))
+                    continue
+                cached = FileStorage.__encoded.get(key)
+                if cached is None or cached[0] is not record:
+                    cached = (record, json.dumps(record))
+                    FileStorage.__encoded[key] = cached
+                parts.append(json.dumps(key) + ": " + cached[1])
+        with open(path + ".tmp", 'w') as f:
+            f.write("{" + ", ".join(parts) + "}")
+            self.__sync(f)
+        os.replace(path + ".tmp", path)
+
+    def __shard_path(self, cls):
+        """returns the path of the file of class cls in the sharded layout"""
+        return os.path.join(os.path.splitext(self.__file_path)[0] +
+                            "_shards", shards[cls])
+
+    def __write_shards(self):
+        """rewrites the files of the classes changed since the last save"""
+        names = {key.split(".", 1)[0] for key in FileStorage.__changes}
+        if not names:
+            return
+        os.makedirs(os.path.dirname(self.__shard_path("State")),
+                    exist_ok=True)
+        loaded = self.__shard_stats()
+        for name in names:
+            path = self.__shard_path(name)
+            if name not in loaded or loaded[name] != stat(path):
+                FileStorage.__pending.add(name)
+            self.__load_shards(name)
+            self.__write_snapshot(path, name)
+            loaded[name] = stat(path)
+
+    def __shard_stats(self):
+        """returns the stat of each shard as last loaded or saved"""
+        if FileStorage.__shards_loaded[0] is not self.__objects:
+            FileStorage.__shards_loaded = (self.__objects, {})
+        return FileStorage.__shards_loaded[1]
+
+    def __load_shards(self, cls=None):
+        """parses the pending files of cls (or of every class)"""
+        if cls is None:
+            names = list(FileStorage.__pending)
+        else:
+            names = [cls if type(cls) is str else cls.__name__]
+        for name in names:
+            if name not in FileStorage.__pending:
+                continue
+            FileStorage.__pending.discard(name)
+            path = self.__shard_path(name)
+            self.__shard_stats()[name] = stat(path)
+            try:
+                with open(path, 'r') as f:
+                    for key, record in iter_items(f):
+                        self.__merge(key, record)
+            except (OSError, ValueError):
+                continue
+
+    def migrate_to_shards(self):
+        """splits the JSON file (and its journal) into per-class files"""
+        with open(self.__file_path, 'r') as f:
+            jo = json.load(f)
+        for entry in self.__journal_entries():
+            if entry["op"] == "delete":
+                jo.pop(entry["key"], None)
+            else:
+                jo[entry["key"]] = entry["obj"]
+        by_class = {name: {} for name in shards}
+        for key, record in jo.items():
+            by_class[record["__class__"]][key] = record
+        os.makedirs(os.path.dirname(self.__shard_path("State")),
+                    exist_ok=True)
+        for name, records in by_class.items():
+            path = self.__shard_path(name)
+            with open(path + ".tmp", 'w') as f:
+                json.dump(records, f)
+            os.replace(path + ".tmp", path)
+
+    def __journal_path(self):
+        """returns the path of the journal kept next to the JSON file"""
+        return self.__file_path + ".journal"
+
+    def __append_journal(self):
+        """appends one line per change since the last save to the journal"""
+        lines = []
+        for key, obj in FileStorage.__changes.items():
+            if obj is None:
+                FileStorage.__encoded.pop(key, None)
+                lines.append('{"op": "delete", "key": ' + json.dumps(key) +
+                             '}\n')
+            else:
+                lines.append('{"op": "upsert", "key": ' + json.dumps(key) +
+                             ', "obj": ' + self.__encode(key, obj) + '}\n')
+        if lines:
+            with open(self.__journal_path(), 'a') as f:
+                f.writelines(lines)
+                self.__sync(f)
+        if os.path.exists(self.__journal_path()) and \
+                os.path.getsize(self.__journal_path()) > self.__journal_max:
+            self.compact()
+
+    def compact(self):
+        """folds the journal into a new snapshot of the JSON file, after
+        merging what other writers added to the files since they were last
+        loaded, so that their changes are not lost"""
+        with FileStorage.__lock:
+            self.reload()
+            self.__write_snapshot(self.__file_path)
+            if os.path.exists(self.__journal_path()):
+                os.remove(self.__journal_path())
+            self.__mark_loaded()
 
     def reload(self):
-        """deserializes the JSON file to __objects"""
+        """deserializes the JSON file to __objects
+
+        The file is parsed one record at a time, so the whole parsed file is
+        never held in memory next to the objects built from it. Nothing is
+        parsed if the files did not change since they were last
+        loaded or saved, and only the objects that differ from the ones in
+        __objects are rebuilt.
+        """
+        with FileStorage.__lock:
+            if self.__mode == "sharded":
+                self.__buckets()
+                loaded = self.__shard_stats()
+                for name in shards:
+                    if name not in loaded or \
+                            loaded[name] != stat(self.__shard_path(name)):
+                        FileStorage.__pending.add(name)
+                return
+            if self.__is_loaded():
+                return
+            self.__buckets()
+            stats = self.__stat()
+            try:
+                with open(self.__file_path, 'r') as f:
+                    for key, record in iter_items(f):
+                        self.__merge(key, record)
+            except Exception as e:
+                pass
+            if self.__mode == "journal":
+                self.__replay_journal()
+            FileStorage.__loaded = (self.__objects, stats)
+
+    def __merge(self, key, record):
+        """rebuilds the object stored under key if record differs from it"""
+        if key in FileStorage.__changes:
+            # changes not written yet win over the file
+            return
+        current = self.__objects.get(key)
+        if current is not None and current.to_dict() == record:
+            return
+        if self.__lazy:
+            if current is not None:
+                self.__pop(key)
+            name = record["__class__"]
+            if self.__packed:
+                record = pack(record)
+            FileStorage.__records.setdefault(name, {})[key] = record
+        else:
+            self.__put(key, classes[record["__class__"]].from_dict(record))
+
+    def __journal_entries(self):
+        """yields the changes recorded in the journal, oldest first"""
         try:
-            with open(self.__file_path, 'r') as f:
-                jo = json.load(f)
-            for key in jo:
-                self.__objects[key] = classes[jo[key]["__class__"]](**jo[key])
-        except Exception as e:
-            pass
+            with open(self.__journal_path(), 'r') as f:
+                for line in f:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        # a torn last line from an interrupted append
+                        return
+        except OSError:
+            return
+
+    def __replay_journal(self):
+        """applies the changes recorded in the journal to __objects"""
+        for entry in self.__journal_entries():
+            if entry["op"] == "delete":
+                if entry["key"] not in FileStorage.__changes:
+                    self.__pop(entry["key"])
+            else:
+                self.__merge(entry["key"], entry["obj"])
 
     def delete(self, obj=None):
         """delete obj from __objects if it’s inside"""
         if obj is not None:
             key = obj.__class__.__name__ + '.' + obj.id
-            if key in self.__objects:
-                del self.__objects[key]
+            with FileStorage.__lock:
+                self.__pop(key)
+                FileStorage.__changes[key] = None
 
     def close(self):
         """call reload() method for deserializing the JSON file to objects"""
@@ -73,20 +806,50 @@ class FileStorage:
         """ Retrieves an object """
         if not cls or not obj_id:
             return None
-
-        from models import storage
-
-        cls_objs = storage.all(cls)
-        if not cls_objs:
-            return None
-
-        obj_key = "{}.{}".format(cls.__name__, obj_id)
-        obj = cls_objs.get(obj_key)
-
-        return obj
+        if type(cls) is not str:
+            cls = cls.__name__
+        key = "{}.{}".format(cls, obj_id)
+        self.__require(cls, build=False)
+        record = FileStorage.__records.get(cls, {}).get(key)
+        if record is not None:
+            with FileStorage.__lock:
+                if FileStorage.__records.get(cls, {}).get(key) is record:
+                    self.__put(key, classes[cls].from_dict(unpack(record)))
+        return self.__objects.get(key)
 
     def count(self, cls=None):
         """ Returns the number of objects in storage """
-        from models import storage
-        objs = storage.all(cls)
-        return len(objs)
+        self.__buckets()
+        self.__require(cls, build=False)
+        if cls is not None:
+            if type(cls) is not str:
+                cls = cls.__name__
+            return len(self.__bucket(cls)) + \
+                len(FileStorage.__records.get(cls, {}))
+        return len(self.__objects) + \
+            sum(len(records) for records in FileStorage.__records.values())
+
+    def counts(self, *clss):
+        """returns {class name: number of objects} for the classes clss (or
+        every class), read from the sizes of the per-class buckets"""
+        names = [cls if type(cls) is str else cls.__name__ for cls in clss]
+        return {name: self.count(name) for name in names or classes}
+
+    def memory_stats(self):
+        """returns {class name: {"objects": number of objects built,
+        "records": number of records not built yet, "bytes": approximate
+        memory they take}}, strings shared by several objects or records
+        (such as interned ids) counted once"""
+        self.__require(build=False)
+        seen = set()
+        stats = {}
+        for name in classes:
+            objs = dict(self.__bucket(name))
+            records = dict(FileStorage.__records.get(name, {}))
+            size = 0
+            for items in (objs, records):
+                for key, value in items.items():
+                    size += size_of(key, seen) + size_of(value, seen)
+            stats[name] = {"objects": len(objs), "records": len(records),
+                           "bytes": size}
+        return stats
@@ -0,0 +1,102 @@
+#!/usr/bin/python3
+"""
+Contains the versioned schema migrations of the database of DBStorage
+
+create_all() only creates the tables that do not exist, so a change to an
+existing table is made by a migration. migrate() applies, in order, the
+migrations whose version is above the one recorded in the schema_version
+table, each in its own transaction. A migration the data does not allow
+yet (such as a unique index over duplicate values) is logged with the rows
+in the way and left pending, with the ones after it, until the next start.
+"""
+
+import logging
+from sqlalchemy import inspect, text
+
+logger = logging.getLogger(__name__)
+
+
+class Pending(Exception):
+    """raised by a migration step that the data does not allow yet"""
+
+
+def duplicates(connection, table, columns):
+    """returns the values of columns held by more than one row of table"""
+    return [tuple(row) for row in connection.execute(text(
+        "SELECT {0} FROM {1} WHERE {2} GROUP BY {0} HAVING COUNT(*) > 1"
+        .format(", ".join(columns), table, " AND ".join(
+            "{} IS NOT NULL".format(column) for column in columns))))]
+
+
+def create_index(name, table, columns, unique=False):
+    """returns a migration step creating an index if it does not exist"""
+    def step(connection):
+        """creates the index on the connection"""
+        if name in {index["name"] for index in
+                    inspect(connection).get_indexes(table)}:
+            return
+        if unique:
+            found = duplicates(connection, table, columns)
+            if found:
+                raise Pending("several rows of {} hold each of these ({})"
+                              ": {}".format(table, ", ".join(columns),
+                                            ", ".join(repr(row)
+                                                      for row in found)))
+        connection.execute(text("CREATE {}INDEX {} ON {} ({})".format(
+            "UNIQUE " if unique else "", name, table, ", ".join(columns))))
+    return step
+
+
+# (version, description, steps) of each migration, in order
+migrations = [
+    (1, "index the listing order of the classes and the foreign keys", [
+        create_index("ix_amenities_created_at", "amenities",
+                     ("created_at", "id")),
+        create_index("ix_states_created_at", "states", ("created_at", "id")),
+        create_index("ix_users_created_at", "users", ("created_at", "id")),
+        create_index("ix_cities_state_id_created_at", "cities",
+                     ("state_id", "created_at", "id")),
+        create_index("ix_places_city_id_created_at", "places",
+                     ("city_id", "created_at", "id")),
+        create_index("ix_places_user_id_created_at", "places",
+                     ("user_id", "created_at", "id")),
+        create_index("ix_reviews_place_id_created_at", "reviews",
+                     ("place_id", "created_at", "id")),
+        create_index("ix_reviews_user_id_created_at", "reviews",
+                     ("user_id", "created_at", "id")),
+    ]),
+    (2, "make the email of users unique", [
+        create_index("ix_users_email", "users", ("email",), unique=True),
+    ]),
+]
+
+
+def version(engine):
+    """returns the version of the schema of the database of engine"""
+    with engine.begin() as connection:
+        connection.execute(text("CREATE TABLE IF NOT EXISTS schema_version "
+                                "(version INTEGER NOT NULL)"))
+        return connection.execute(text(
+            "SELECT MAX(version) FROM schema_version")).scalar() or 0
+
+
+def migrate(engine):
+    """applies the pending migrations and returns their versions"""
+    current = version(engine)
+    applied = []
+    for number, description, steps in migrations:
+        if number <= current:
+            continue
+        try:
+            with engine.begin() as connection:
+                for step in steps:
+                    step(connection)
+                connection.execute(text("INSERT INTO schema_version "
+                                        "(version) VALUES (:version)"),
+                                   {"version": number})
+        except Pending as e:
+            logger.warning("migration %d (%s) left pending: %s", number,
+                           description, e)
+            break
+        applied.append(number)
+    return applied
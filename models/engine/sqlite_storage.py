@@ -0,0 +1,371 @@
+#!/usr/bin/python3
+"""
+Contains the class SQLiteStorage
+"""
+
+from datetime import datetime
+import json
+import logging
+from models.amenity import Amenity
+from models.base_model import BaseModel, time
+from models.city import City
+from models.engine.file_storage import follows, order_objects
+from models.place import Place
+from models.review import Review
+from models.state import State
+from models.user import User
+from os import getenv
+import sqlite3
+import threading
+
+logger = logging.getLogger(__name__)
+classes = {"Amenity": Amenity, "BaseModel": BaseModel, "City": City,
+           "Place": Place, "Review": Review, "State": State, "User": User}
+
+# table and columns of each class, by class name; any other attribute of
+# an object is kept as JSON in the extra column of its row
+tables = {
+    "Amenity": ("amenities", (("name", "TEXT"),)),
+    "BaseModel": ("base_models", ()),
+    "City": ("cities", (("state_id", "TEXT"), ("name", "TEXT"))),
+    "Place": ("places", (("city_id", "TEXT"), ("user_id", "TEXT"),
+                         ("name", "TEXT"), ("description", "TEXT"),
+                         ("number_rooms", "INTEGER"),
+                         ("number_bathrooms", "INTEGER"),
+                         ("max_guest", "INTEGER"),
+                         ("price_by_night", "INTEGER"),
+                         ("latitude", "REAL"), ("longitude", "REAL"))),
+    "Review": ("reviews", (("place_id", "TEXT"), ("user_id", "TEXT"),
+                           ("text", "TEXT"))),
+    "State": ("states", (("name", "TEXT"),)),
+    "User": ("users", (("email", "TEXT"), ("password", "TEXT"),
+                       ("first_name", "TEXT"), ("last_name", "TEXT"))),
+}
+# (name, columns, unique) of the indexes of each class, by class name: the
+# listing order of the API and each foreign key followed by that order
+indexes = {
+    "Amenity": (("ix_amenities_created_at", ("created_at", "id"), False),),
+    "City": (("ix_cities_state_id_created_at",
+              ("state_id", "created_at", "id"), False),),
+    "Place": (("ix_places_city_id_created_at",
+               ("city_id", "created_at", "id"), False),
+              ("ix_places_user_id_created_at",
+               ("user_id", "created_at", "id"), False)),
+    "Review": (("ix_reviews_place_id_created_at",
+                ("place_id", "created_at", "id"), False),
+               ("ix_reviews_user_id_created_at",
+                ("user_id", "created_at", "id"), False)),
+    "State": (("ix_states_created_at", ("created_at", "id"), False),),
+    "User": (("ix_users_created_at", ("created_at", "id"), False),
+             ("ix_users_email", ("email",), True)),
+}
+# indexes of earlier versions that the ones above replace
+retired_indexes = ("ix_cities_state_id", "ix_places_city_id",
+                   "ix_places_user_id", "ix_reviews_place_id",
+                   "ix_reviews_user_id")
+
+
+class SQLiteStorage:
+    """stores instances in one table per class of a SQLite database
+
+    Each thread has its own connection, transaction, loaded objects and
+    pending changes (like the scoped session of DBStorage), so close() at
+    the end of a request only discards the work of the calling thread.
+    """
+
+    def __init__(self):
+        """Instantiate a SQLiteStorage object"""
+        self.__path = getenv('HBNB_SQLITE_DB', 'hbnb.db')
+        HBNB_ENV = getenv('HBNB_ENV')
+        self.__local = threading.local()
+        if HBNB_ENV == "test":
+            connection = self.__thread().connection
+            for table, columns in tables.values():
+                connection.execute("DROP TABLE IF EXISTS {}".format(table))
+            connection.commit()
+
+    def __thread(self):
+        """returns the state of the calling thread, created on first use:
+        connection, objects (read or added since the last close(), by
+        <class name>.id) and changes (objects changed since the last flush,
+        None for deleted ones)"""
+        local = self.__local
+        if not hasattr(local, "connection"):
+            local.connection = sqlite3.connect(self.__path)
+            local.connection.row_factory = sqlite3.Row
+            local.connection.execute("PRAGMA journal_mode=WAL")
+            local.objects = {}
+            local.changes = {}
+        return local
+
+    def __name(self, cls):
+        """returns the class name of cls (name or class)"""
+        if type(cls) is not str:
+            cls = cls.__name__
+        return cls
+
+    def __columns(self, name):
+        """returns the column names of the table of class name"""
+        return ["id", "created_at", "updated_at"] + \
+            [column for column, kind in tables[name][1]] + ["extra"]
+
+    def __row(self, name, obj):
+        """returns the column values of obj"""
+        record = obj.to_dict()
+        del record["__class__"]
+        row = [record.pop("id"), record.pop("created_at", None),
+               record.pop("updated_at", None)]
+        for column, kind in tables[name][1]:
+            row.append(record.pop(column, None))
+        row.append(json.dumps(record) if record else None)
+        return row
+
+    def __build(self, name, row):
+        """returns the object of a row, from the identity map if loaded"""
+        local = self.__thread()
+        key = name + "." + row["id"]
+        obj = local.objects.get(key)
+        if obj is None:
+            record = json.loads(row["extra"]) if row["extra"] else {}
+            for column in row.keys():
+                if column != "extra" and row[column] is not None:
+                    record[column] = row[column]
+            obj = classes[name].from_dict(record)
+            local.objects[key] = obj
+        return obj
+
+    def __select(self, name, where="", params=()):
+        """returns {<class name>.id: object} for the matching rows"""
+        local = self.__thread()
+        rows = local.connection.execute(
+            "SELECT * FROM {} {}".format(tables[name][0], where), params)
+        new_dict = {}
+        for row in rows:
+            new_dict[name + "." + row["id"]] = self.__build(name, row)
+        return new_dict
+
+    def __flush(self):
+        """writes the pending changes to the current transaction"""
+        local = self.__thread()
+        if not local.changes:
+            return
+        changes = local.changes
+        local.changes = {}
+        upserts = {}
+        for key, obj in changes.items():
+            name, obj_id = key.split(".", 1)
+            if obj is None:
+                local.connection.execute(
+                    "DELETE FROM {} WHERE id = ?".format(tables[name][0]),
+                    (obj_id,))
+            else:
+                upserts.setdefault(name, []).append(self.__row(name, obj))
+        for name, rows in upserts.items():
+            columns = self.__columns(name)
+            local.connection.executemany(
+                "INSERT INTO {} ({}) VALUES ({}) ON CONFLICT(id) DO UPDATE "
+                "SET {}".format(tables[name][0], ", ".join(columns),
+                                ", ".join("?" * len(columns)),
+                                ", ".join("{0} = excluded.{0}".format(c)
+                                          for c in columns[1:])), rows)
+
+    def all(self, cls=None, load=None):
+        """returns the objects of cls (or of every class) by <class>.id;
+        load is ignored as relationships are indexed queries here"""
+        self.__flush()
+        new_dict = {}
+        for name in tables:
+            if cls is None or self.__name(cls) == name:
+                new_dict.update(self.__select(name))
+        return new_dict
+
+    def iter(self, cls=None, batch_size=1000):
+        """yields the objects of cls (or of every class), fetching the
+        rows batch_size at a time"""
+        local = self.__thread()
+        for name in tables:
+            if cls is not None and self.__name(cls) != name:
+                continue
+            self.__flush()
+            cursor = local.connection.execute(
+                "SELECT * FROM {}".format(tables[name][0]))
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                objs = [self.__build(name, row) for row in rows]
+                if not objs:
+                    break
+                for obj in objs:
+                    yield obj
+
+    def new(self, obj):
+        """adds the object to the objects to write on the next save"""
+        local = self.__thread()
+        if obj is not None:
+            key = obj.__class__.__name__ + "." + obj.id
+            local.objects[key] = obj
+            local.changes[key] = obj
+
+    def bulk_new(self, objs):
+        """adds every object of objs to the objects to write on the next
+        save, which inserts them with one executemany per table"""
+        local = self.__thread()
+        for obj in objs:
+            key = obj.__class__.__name__ + "." + obj.id
+            local.objects[key] = obj
+            local.changes[key] = obj
+
+    def mark_dirty(self, obj, attr=None):
+        """records that obj changed if it is the object loaded for its key"""
+        local = self.__thread()
+        obj_id = obj.__dict__.get("id")
+        if obj_id is None:
+            return
+        key = obj.__class__.__name__ + "." + obj_id
+        if local.objects.get(key) is obj:
+            local.changes[key] = obj
+
+    def save(self):
+        """writes the changed objects and commits the transaction"""
+        local = self.__thread()
+        self.__flush()
+        local.connection.commit()
+
+    def delete(self, obj=None):
+        """deletes obj from the database on the next save"""
+        local = self.__thread()
+        if obj is not None:
+            key = obj.__class__.__name__ + "." + obj.id
+            local.objects.pop(key, None)
+            local.changes[key] = None
+
+    def reload(self):
+        """creates the tables and indexes that do not exist yet; a unique
+        index over duplicate values is logged and left out until they are
+        fixed"""
+        local = self.__thread()
+        for name, (table, columns) in tables.items():
+            local.connection.execute(
+                "CREATE TABLE IF NOT EXISTS {} (id TEXT PRIMARY KEY, "
+                "created_at TEXT, updated_at TEXT, {}extra TEXT)"
+                .format(table, "".join("{} {}, ".format(*column)
+                                       for column in columns)))
+            for index, columns, unique in indexes.get(name, ()):
+                if unique:
+                    found = local.connection.execute(
+                        "SELECT {0} FROM {1} WHERE {2} GROUP BY {0} "
+                        "HAVING COUNT(*) > 1".format(
+                            ", ".join(columns), table, " AND ".join(
+                                "{} IS NOT NULL".format(column)
+                                for column in columns))).fetchall()
+                    if found:
+                        logger.warning(
+                            "index %s left out: several rows of %s hold "
+                            "each of these (%s): %s", index, table,
+                            ", ".join(columns),
+                            ", ".join(repr(tuple(row)) for row in found))
+                        continue
+                local.connection.execute(
+                    "CREATE {}INDEX IF NOT EXISTS {} ON {} ({})".format(
+                        "UNIQUE " if unique else "", index, table,
+                        ", ".join(columns)))
+        for index in retired_indexes:
+            local.connection.execute(
+                "DROP INDEX IF EXISTS {}".format(index))
+        local.connection.commit()
+
+    def close(self):
+        """discards the uncommitted changes and the loaded objects"""
+        local = self.__thread()
+        local.connection.rollback()
+        local.objects = {}
+        local.changes = {}
+
+    def get(self, cls, obj_id):
+        """ Retrieves an object """
+        local = self.__thread()
+        if not cls or not obj_id:
+            return None
+        name = self.__name(cls)
+        if name not in tables:
+            return None
+        self.__flush()
+        obj = local.objects.get(name + "." + obj_id)
+        if obj is not None:
+            return obj
+        objs = self.__select(name, "WHERE id = ?", (obj_id,))
+        return objs.get(name + "." + obj_id)
+
+    def count(self, cls=None):
+        """ Returns the number of objects in storage """
+        if cls is None:
+            return sum(self.counts().values())
+        name = self.__name(cls)
+        if name not in tables:
+            return 0
+        return self.counts(name)[name]
+
+    def counts(self, *clss):
+        """returns {class name: number of rows} for the classes clss (or
+        every class), counted by a single UNION ALL of SELECT COUNT(*)"""
+        local = self.__thread()
+        names = [self.__name(cls) for cls in clss] or list(tables)
+        sql = " UNION ALL ".join("SELECT ?, COUNT(*) FROM {}".format(
+            tables[name][0]) for name in names)
+        self.__flush()
+        return dict(local.connection.execute(sql, names).fetchall())
+
+    def related(self, cls, attr, value):
+        """returns the objects of cls whose attribute attr equals value"""
+        name = self.__name(cls)
+        if attr not in self.__columns(name)[:-1]:
+            return {k: v for k, v in self.all(name).items()
+                    if getattr(v, attr, None) == value}
+        self.__flush()
+        return self.__select(name, "WHERE {} = ?".format(attr), (value,))
+
+    def filter(self, cls, order_by=None, limit=None, offset=0, after=None,
+               load=None, **equals):
+        """returns the list of objects of cls whose attributes equal the
+        values in equals, sorted by order_by (see order_objects), past the
+        keyset cursor after (see follows) and sliced by offset and limit,
+        in one query when they are all columns; load is ignored"""
+        name = self.__name(cls)
+        columns = self.__columns(name)[:-1]
+        if isinstance(order_by, str):
+            order_by = [order_by]
+        order_by = order_by or []
+        if any(attr not in columns for attr in equals) or \
+                any(attr.lstrip("-") not in columns for attr in order_by):
+            objs = [obj for obj in self.all(name).values()
+                    if all(getattr(obj, attr, None) == value
+                           for attr, value in equals.items())]
+            if after is not None:
+                objs = [obj for obj in objs if follows(obj, order_by, after)]
+            order_objects(objs, order_by)
+            if limit is None:
+                return objs[offset:]
+            return objs[offset:offset + limit]
+        where = ["{} = ?".format(attr) for attr in equals]
+        params = list(equals.values())
+        if after is not None:
+            terms = []
+            for i, attr in enumerate(order_by[:len(after)]):
+                terms.append(" AND ".join(
+                    ["{} = ?".format(a.lstrip("-")) for a in order_by[:i]] +
+                    ["{} {} ?".format(attr.lstrip("-"),
+                                      "<" if attr.startswith("-") else ">")]))
+                params += list(after[:i + 1])
+            where.append("(" + " OR ".join(terms) + ")")
+        params = [value.strftime(time) if isinstance(value, datetime)
+                  else value for value in params]
+        sql = ""
+        if where:
+            sql += "WHERE " + " AND ".join(where)
+        if order_by:
+            sql += " ORDER BY " + ", ".join(
+                attr.lstrip("-") + (" DESC" if attr.startswith("-") else "")
+                for attr in order_by)
+        sql += " LIMIT ? OFFSET ?"
+        params += [-1 if limit is None else limit, offset]
+        self.__flush()
+        return list(self.__select(name, sql, params).values())
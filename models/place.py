@@ -4,7 +4,8 @@ import models
 from models.base_model import BaseModel, Base
 from os import getenv
 import sqlalchemy
-from sqlalchemy import Column, String, Integer, Float, ForeignKey, Table
+from sqlalchemy import Column, String, Integer, Float, ForeignKey, Index, \
+    Table
 from sqlalchemy.orm import relationship
 
 if models.storage_t == 'db':
@@ -23,6 +24,10 @@ class Place(BaseModel, Base):
     """Representation of Place """
     if models.storage_t == 'db':
         __tablename__ = 'places'
+        __table_args__ = (Index('ix_places_city_id_created_at', 'city_id',
+                                'created_at', 'id'),
+                          Index('ix_places_user_id_created_at', 'user_id',
+                                'created_at', 'id'))
         city_id = Column(String(60), ForeignKey('cities.id'), nullable=False)
         user_id = Column(String(60), ForeignKey('users.id'), nullable=False)
         name = Column(String(128), nullable=False)
@@ -59,12 +64,8 @@ class Place(BaseModel, Base):
         def reviews(self):
             """getter attribute returns the list of Review instances"""
             from models.review import Review
-            review_list = []
-            all_reviews = models.storage.all(Review)
-            for review in all_reviews.values():
-                if review.place_id == self.id:
-                    review_list.append(review)
-            return review_list
+            return list(models.storage.related(Review, "place_id",
+                                               self.id).values())
 
         @property
         def amenities(self):
@@ -5,7 +5,7 @@ from models.base_model import BaseModel, Base
 from models.city import City
 from os import getenv
 import sqlalchemy
-from sqlalchemy import Column, String, ForeignKey
+from sqlalchemy import Column, String, ForeignKey, Index
 from sqlalchemy.orm import relationship
 
 
@@ -13,6 +13,7 @@ class State(BaseModel, Base):
     """Representation of state """
     if models.storage_t == "db":
         __tablename__ = 'states'
+        __table_args__ = (Index('ix_states_created_at', 'created_at', 'id'),)
         name = Column(String(128), nullable=False)
         cities = relationship("City", backref="state")
     else:
@@ -26,9 +27,5 @@ class State(BaseModel, Base):
         @property
         def cities(self):
             """getter for list of city instances related to the state"""
-            city_list = []
-            all_cities = models.storage.all(City)
-            for city in all_cities.values():
-                if city.state_id == self.id:
-                    city_list.append(city)
-            return city_list
+            return list(models.storage.related(City, "state_id",
+                                               self.id).values())
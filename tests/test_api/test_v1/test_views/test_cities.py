@@ -32,9 +32,12 @@ class CityApiTestCase(unittest.TestCase):
 
     def tearDown(self):
         """ Cleans up test environment """
-        # Delete test state object
+        # Delete the cities of the test state, including the ones the
+        # tests created, before the state they reference
+        for city in storage.filter(City, state_id=self.state.id):
+            city.delete()
+        storage.save()
         self.state.delete()
-        self.city.delete()
         storage.save()
 
         # Close storage
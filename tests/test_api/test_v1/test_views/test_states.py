@@ -90,6 +90,40 @@ class StateApiTestCase(unittest.TestCase):
         state = storage.get(State, self.state.id)
         self.assertEqual(state.name, 'Updated State')
 
+    def test_get_states_paginated(self):
+        """ Test GET /api/v1/states with limit, offset and cursor """
+        states = [State(name='Page State {}'.format(i)) for i in range(4)]
+        for state in states:
+            state.save()
+        response = self.app.get('/api/v1/states?limit=2&offset=1')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(json.loads(response.data)), 2)
+
+        ids = []
+        url = '/api/v1/states?limit=2'
+        while url:
+            response = self.app.get(url)
+            self.assertEqual(response.status_code, 200)
+            page = json.loads(response.data)
+            self.assertLessEqual(len(page), 2)
+            ids += [obj['id'] for obj in page]
+            link = response.headers.get('Link')
+            url = link[1:link.index('>')] if link else None
+            if link:
+                self.assertIn(response.headers['X-Next-Cursor'], url)
+        self.assertEqual(len(ids), len(set(ids)))
+        self.assertEqual(set(ids),
+                         {s.id for s in storage.all(State).values()})
+        for state in states:
+            state.delete()
+        storage.save()
+
+    def test_get_states_bad_page(self):
+        """ Test that invalid paging arguments are rejected """
+        for query in ('limit=0', 'limit=x', 'offset=-1', 'cursor=xyz'):
+            response = self.app.get('/api/v1/states?' + query)
+            self.assertEqual(response.status_code, 400)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -79,6 +79,14 @@ class UserApiTestCase(unittest.TestCase):
         user_key = f"User.{data_returned['id']}"
         self.assertIn(user_key, storage.all(User))
 
+        # Test create user with an email already used
+        response = self.app.post('/api/v1/users/',
+                                 data=json.dumps(user_data),
+                                 content_type='application/json')
+        self.assertEqual(response.status_code, 409)
+        storage.all(User)[user_key].delete()
+        storage.save()
+
         # Test create user without email
         response = self.app.post('/api/v1/users/',
                                  data=json.dumps({}),
@@ -98,6 +106,21 @@ class UserApiTestCase(unittest.TestCase):
         user = storage.get(User, self.user.id)
         self.assertEqual(user.name, 'Updated User')
 
+    def test_update_user_email_used(self):
+        """ Test PUT /api/v1/user/<user_id>' with another user's email """
+        other = User(email='test03@gmail.com', password='0123')
+        other.save()
+        response = self.app.put(f'/api/v1/users/{other.id}',
+                                data=json.dumps({'email': self.user.email}),
+                                content_type='application/json')
+        self.assertEqual(response.status_code, 409)
+        response = self.app.put(f'/api/v1/users/{self.user.id}',
+                                data=json.dumps({'email': self.user.email}),
+                                content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        other.delete()
+        storage.save()
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -2,6 +2,7 @@
 """Test BaseModel for expected behavior and documentation"""
 from datetime import datetime
 import inspect
+import json
 import models
 import pep8 as pycodestyle
 import time
@@ -138,6 +139,60 @@ class TestBaseModel(unittest.TestCase):
         self.assertEqual(new_d["created_at"], bm.created_at.strftime(t_format))
         self.assertEqual(new_d["updated_at"], bm.updated_at.strftime(t_format))
 
+    def test_to_dict_cache(self):
+        """Test that to_dict returns copies of the cached dictionary until
+        an attribute is assigned"""
+        bm = BaseModel()
+        bm.name = "Holberton"
+        first = bm.to_dict()
+        first["name"] = "changed"
+        self.assertEqual(bm.to_dict()["name"], "Holberton")
+        self.assertIsNot(bm.to_dict(), bm.to_dict())
+        bm.name = "Betty"
+        self.assertEqual(bm.to_dict()["name"], "Betty")
+        self.assertNotIn("_BaseModel__encoded", bm.__dict__)
+
+    @mock.patch('models.storage')
+    def test_to_json(self, mock_storage):
+        """Test that to_json encodes to_dict and is invalidated by save"""
+        bm = BaseModel()
+        bm.tags = ["a"]
+        text = bm.to_json()
+        self.assertEqual(json.loads(text), bm.to_dict())
+        if models.storage_t != "db":
+            self.assertIs(bm.to_json(), text)
+        bm.tags.append("b")
+        bm.invalidate()
+        self.assertEqual(json.loads(bm.to_json())["tags"], ["a", "b"])
+        bm.save()
+        self.assertEqual(json.loads(bm.to_json())["updated_at"],
+                         bm.to_dict()["updated_at"])
+        self.assertEqual(bm.to_dict()["updated_at"],
+                         bm.updated_at.strftime("%Y-%m-%dT%H:%M:%S.%f"))
+
+    def test_from_dict(self):
+        """Test that from_dict rebuilds the object to_dict describes"""
+        bm = BaseModel()
+        bm.name = "Holberton"
+        bm.my_number = 89
+        if models.storage_t == "db":
+            copy = BaseModel.from_dict(bm.to_dict())
+        else:
+            with mock.patch.object(BaseModel, "__init__") as init:
+                copy = BaseModel.from_dict(bm.to_dict())
+            self.assertFalse(init.called)
+        self.assertIsNot(copy, bm)
+        self.assertEqual(copy.to_dict(), bm.to_dict())
+        self.assertEqual(copy.created_at, bm.created_at)
+        self.assertIs(type(copy.updated_at), datetime)
+
+    def test_from_dict_partial(self):
+        """Test that from_dict fills in what a record is missing"""
+        copy = BaseModel.from_dict({"name": "Holberton"})
+        self.assertEqual(copy.name, "Holberton")
+        self.assertIs(type(copy.id), str)
+        self.assertIs(type(copy.created_at), datetime)
+
     def test_str(self):
         """test that the str method has the correct output"""
         inst = BaseModel()
@@ -16,8 +16,13 @@ from models.state import State
 from models.user import User
 import json
 import os
+import importlib
 import pep8
+from sqlalchemy import create_engine, event, exc
+import tempfile
+import threading
 import unittest
+from unittest import mock
 DBStorage = db_storage.DBStorage
 classes = {"Amenity": Amenity, "City": City, "Place": Place,
            "Review": Review, "State": State, "User": User}
@@ -104,8 +109,296 @@ class TestDBStorage(unittest.TestCase):
         city_count = len(models.storage.all(City))
         self.assertEqual(city_count, models.storage.count(City))
 
+    @unittest.skipIf(models.storage_t != 'db', "not testing db storage")
+    def test_bulk_new(self):
+        """Test that bulk_new inserts the rows on the next save"""
+        state = State(name="Bulk State")
+        cities = [City(name="City {}".format(i), state_id=state.id)
+                  for i in range(3)]
+        count = models.storage.count(City)
+        models.storage.bulk_new(cities + [state])
+        models.storage.save()
+        models.storage.close()
+        self.assertEqual(models.storage.count(City), count + 3)
+        self.assertEqual(models.storage.get(City, cities[0].id).name,
+                         "City 0")
+
+    @unittest.skipIf(models.storage_t != 'db', "not testing db storage")
+    def test_counts(self):
+        """Test that counts matches count for each class"""
+        counts = models.storage.counts(State, "City")
+        self.assertEqual(counts, {"State": models.storage.count(State),
+                                  "City": models.storage.count(City)})
+
     @unittest.skipIf(models.storage_t != 'db', "not testing db storage")
     def test_count_without_class(self):
         """ Test the count method without class argument"""
         obj_count = len(models.storage.all())
         self.assertEqual(obj_count, models.storage.count())
+
+    @unittest.skipIf(models.storage_t != 'db', "not testing db storage")
+    def test_filter(self):
+        """Test that filter returns the matching rows in order"""
+        state = State(name="Filter State")
+        state.save()
+        cities = [City(name=name, state_id=state.id) for name in "bac"]
+        for city in cities:
+            city.save()
+        self.assertEqual(models.storage.filter(City, state_id=state.id,
+                                               order_by="name"),
+                         [cities[1], cities[0], cities[2]])
+        self.assertEqual(models.storage.filter(City, state_id=state.id,
+                                               order_by="-name", limit=1,
+                                               offset=1), [cities[0]])
+        self.assertEqual(models.storage.filter(City, state_id=state.id,
+                                               order_by="name",
+                                               after=("a",)),
+                         [cities[0], cities[2]])
+
+
+@unittest.skipIf(models.storage_t != 'db', "not testing db storage")
+class TestDBStorageEagerLoading(unittest.TestCase):
+    """Test that pages walking relationships use a fixed number of queries"""
+    def setUp(self):
+        """Create a few states with cities and count the statements"""
+        self.objs = []
+        for i in range(5):
+            state = State(name="State {}".format(i))
+            self.objs.append(state)
+            self.objs.append(City(name="City {}".format(i),
+                                  state_id=state.id))
+        for obj in self.objs:
+            models.storage.new(obj)
+        models.storage.save()
+        models.storage.close()
+        self.engine = models.storage._DBStorage__engine
+        self.statements = []
+        event.listen(self.engine, "before_cursor_execute", self.count)
+
+    def tearDown(self):
+        """Remove the objects and stop counting"""
+        event.remove(self.engine, "before_cursor_execute", self.count)
+        for obj in reversed(self.objs):
+            models.storage.delete(models.storage.get(type(obj), obj.id))
+        models.storage.save()
+
+    def count(self, conn, cursor, statement, *args):
+        """records a statement sent to the database"""
+        self.statements.append(statement)
+
+    def test_cities_by_states_page(self):
+        """Test that /cities_by_states does not query once per state"""
+        module = importlib.import_module("web_flask.8-cities_by_states")
+        response = module.app.test_client().get("/cities_by_states")
+        self.assertEqual(response.status_code, 200)
+        selects = [s for s in self.statements
+                   if s.lstrip().upper().startswith("SELECT")]
+        self.assertLessEqual(len(selects), 2, selects)
+
+    def test_filter_load(self):
+        """Test that filter eager loads the named relationships"""
+        states = models.storage.filter(State, load="cities")
+        del self.statements[:]
+        for state in states:
+            state.cities
+        self.assertEqual(self.statements, [])
+
+
+@unittest.skipIf(models.storage_t != 'db', "not testing db storage")
+class TestDBStorageIndexes(unittest.TestCase):
+    """Test that the paged list queries use the indexes of the models"""
+    def setUp(self):
+        """Record the statements sent to the database"""
+        self.engine = models.storage._DBStorage__engine
+        if self.engine.dialect.name != "sqlite":
+            self.skipTest("EXPLAIN QUERY PLAN needs a SQLite database")
+        self.statements = []
+        event.listen(self.engine, "before_cursor_execute", self.record)
+
+    def tearDown(self):
+        """Stop recording"""
+        event.remove(self.engine, "before_cursor_execute", self.record)
+
+    def record(self, conn, cursor, statement, parameters, *args):
+        """records a statement and its parameters"""
+        self.statements.append((statement, parameters))
+
+    def test_list_queries_use_indexes(self):
+        """Test with EXPLAIN that the list queries do not sort"""
+        order = ["created_at", "id"]
+        after = (datetime(2020, 1, 1), "x")
+        models.storage.filter(City, state_id="x", order_by=order, limit=2,
+                              after=after)
+        models.storage.filter(Place, city_id="x", order_by=order, limit=2)
+        models.storage.filter(Review, place_id="x", order_by=order, limit=2)
+        models.storage.filter(State, order_by=order, limit=2, after=after)
+        expected = ["ix_cities_state_id_created_at",
+                    "ix_places_city_id_created_at",
+                    "ix_reviews_place_id_created_at",
+                    "ix_states_created_at"]
+        statements = [s for s in self.statements if s[0].startswith("SELECT")]
+        self.assertEqual(len(statements), len(expected))
+        with self.engine.connect() as conn:
+            for (statement, parameters), index in zip(statements, expected):
+                plan = " ".join(row[3] for row in conn.exec_driver_sql(
+                    "EXPLAIN QUERY PLAN " + statement, parameters))
+                self.assertIn("USING INDEX " + index, plan, statement)
+                self.assertNotIn("TEMP B-TREE", plan, statement)
+
+
+@unittest.skipIf(models.storage_t != 'db', "not testing db storage")
+class TestDBStorageURL(unittest.TestCase):
+    """Test DBStorage on the database of HBNB_DB_URL"""
+    def storage(self, url, **env):
+        """returns a reloaded DBStorage on url"""
+        env.update({"HBNB_DB_URL": url, "HBNB_ENV": ""})
+        with mock.patch.dict(os.environ, env):
+            storage = DBStorage()
+        storage.reload()
+        return storage
+
+    def test_memory(self):
+        """Test that every session shares one in-memory database"""
+        storage = self.storage("sqlite:///:memory:")
+        engine = storage._DBStorage__engine
+        self.assertIsInstance(engine.pool, db_storage.StaticPool)
+        state = State(name="California")
+        storage.new(state)
+        storage.save()
+        storage.close()
+        found = []
+        thread = threading.Thread(target=lambda: found.append(
+            storage.get(State, state.id)))
+        thread.start()
+        thread.join()
+        self.assertEqual(found[0].name, "California")
+
+    def test_file(self):
+        """Test that a database file URL gets the pool settings"""
+        with tempfile.TemporaryDirectory() as tmp:
+            storage = self.storage("sqlite:///" + os.path.join(tmp, "h.db"),
+                                   HBNB_DB_POOL_SIZE="3")
+            engine = storage._DBStorage__engine
+            self.assertEqual(engine.pool.size(), 3)
+            self.assertEqual(storage.count(State), 0)
+            storage.close()
+            engine.dispose()
+
+
+class TestPoolMonitor(unittest.TestCase):
+    """Test the pool settings and the PoolMonitor class"""
+    def setUp(self):
+        """Create an engine on a temporary SQLite database"""
+        self.tmp = tempfile.TemporaryDirectory()
+        env = {"HBNB_DB_POOL_SIZE": "1", "HBNB_DB_POOL_MAX_OVERFLOW": "1",
+               "HBNB_DB_POOL_TIMEOUT": "0.05",
+               "HBNB_DB_POOL_PRE_PING": "true"}
+        with mock.patch.dict(os.environ, env):
+            self.options = db_storage.pool_options()
+        self.engine = create_engine("sqlite:///" + os.path.join(
+            self.tmp.name, "pool.db"), **self.options)
+        self.monitor = db_storage.PoolMonitor(self.engine.pool)
+
+    def tearDown(self):
+        """Dispose of the engine"""
+        self.engine.dispose()
+        self.tmp.cleanup()
+
+    def test_pool_options(self):
+        """Test that the HBNB_DB_POOL_* variables are parsed"""
+        self.assertEqual(self.options, {"pool_size": 1, "max_overflow": 1,
+                                        "pool_timeout": 0.05,
+                                        "pool_pre_ping": True})
+        with mock.patch.dict(os.environ, {"HBNB_DB_POOL_RECYCLE": "3600"}):
+            self.assertEqual(db_storage.pool_options()["pool_recycle"],
+                             3600)
+
+    def test_stats(self):
+        """Test the in use, overflow and timeout counters"""
+        first = self.engine.connect()
+        second = self.engine.connect()
+        stats = self.monitor.stats()
+        self.assertEqual(stats["in_use"], 2)
+        self.assertEqual(stats["overflow"], 1)
+        with self.assertRaises(exc.TimeoutError):
+            self.engine.connect()
+        self.assertGreaterEqual(self.monitor.stats()["wait_max"], 0.05)
+        first.close()
+        second.close()
+        stats = self.monitor.stats()
+        self.assertEqual(stats["checkouts"], 2)
+        self.assertEqual(stats["timeouts"], 1)
+        self.assertEqual(stats["in_use"], 0)
+        self.assertEqual(stats["max_in_use"], 2)
+
+
+class TestObjectCache(unittest.TestCase):
+    """Test the ObjectCache class"""
+    def test_lru(self):
+        """Test that the least recently used entry is evicted"""
+        cache = db_storage.ObjectCache(2)
+        cache.put("State.1", {"id": "1"})
+        cache.put("State.2", {"id": "2"})
+        self.assertEqual(cache.get("State.1"), {"id": "1"})
+        cache.put("State.3", {"id": "3"})
+        self.assertIsNone(cache.get("State.2"))
+        self.assertEqual(cache.get("State.3"), {"id": "3"})
+        self.assertEqual(cache.stats(), {"hits": 2, "misses": 1,
+                                         "evictions": 1, "expirations": 0,
+                                         "size": 2, "max_size": 2})
+
+    def test_ttl(self):
+        """Test that entries expire after ttl seconds"""
+        cache = db_storage.ObjectCache(10, ttl=60)
+        cache.put("State.1", {"id": "1"})
+        self.assertIsNotNone(cache.get("State.1"))
+        with mock.patch.object(db_storage.time, "monotonic",
+                               return_value=db_storage.time.monotonic() + 61):
+            self.assertIsNone(cache.get("State.1"))
+        self.assertEqual(cache.stats()["expirations"], 1)
+
+    def test_invalidate(self):
+        """Test that invalidate and clear drop entries"""
+        cache = db_storage.ObjectCache(10)
+        cache.put("State.1", {"id": "1"})
+        cache.put("State.2", {"id": "2"})
+        cache.invalidate(["State.1", "State.3"])
+        self.assertIsNone(cache.get("State.1"))
+        self.assertIsNotNone(cache.get("State.2"))
+        cache.clear()
+        self.assertEqual(cache.stats()["size"], 0)
+
+
+@unittest.skipIf(models.storage_t != 'db', "not testing db storage")
+class TestDBStorageCache(unittest.TestCase):
+    """Test the object cache of DBStorage"""
+    def setUp(self):
+        """Use a storage with a cache of ten objects"""
+        env = {"HBNB_DB_CACHE_SIZE": "10", "HBNB_ENV": ""}
+        with mock.patch.dict(os.environ, env):
+            self.storage = DBStorage()
+        self.storage.reload()
+        self.state = State(name="California")
+        self.storage.new(self.state)
+        self.storage.save()
+        self.storage.close()
+
+    def tearDown(self):
+        """Remove the state"""
+        self.storage.delete(self.storage.get(State, self.state.id))
+        self.storage.save()
+        self.storage.close()
+
+    def test_get_is_cached(self):
+        """Test that get reads the database once until the object changes"""
+        self.storage.get(State, self.state.id)
+        self.storage.close()
+        state = self.storage.get(State, self.state.id)
+        self.assertEqual(state.name, "California")
+        self.assertEqual(self.storage.cache_stats()["hits"], 1)
+        state.name = "Nevada"
+        self.storage.save()
+        self.storage.close()
+        self.assertEqual(self.storage.get(State, self.state.id).name,
+                         "Nevada")
+        self.assertEqual(self.storage.cache_stats()["misses"], 2)
@@ -5,6 +5,7 @@ Contains the TestFileStorageDocs classes
 
 from datetime import datetime
 import inspect
+import io
 import models
 from models.engine import file_storage
 from models.amenity import Amenity
@@ -17,7 +18,13 @@ from models.user import User
 import json
 import os
 import pep8
+import sys
+import tempfile
+import threading
+import time
+import timeit
 import unittest
+from unittest import mock
 FileStorage = file_storage.FileStorage
 classes = {"Amenity": Amenity, "BaseModel": BaseModel, "City": City,
            "Place": Place, "Review": Review, "State": State, "User": User}
@@ -68,6 +75,64 @@ test_file_storage.py'])
                             "{:s} method needs a docstring".format(func[0]))
 
 
+def file_environ(mode="snapshot", lazy=False, packed=False,
+                 flush_interval=0):
+    """returns the HBNB_FILE_* settings of a FileStorage in the given mode,
+    every other setting left at its default"""
+    return {"HBNB_FILE_MODE": mode, "HBNB_FILE_LAZY": "1" if lazy else "",
+            "HBNB_FILE_COMPACT": "1" if packed else "",
+            "HBNB_FILE_FLUSH_INTERVAL": str(flush_interval),
+            "HBNB_FILE_FLUSH_BATCH": "100", "HBNB_FILE_DURABILITY": "",
+            "HBNB_FILE_JOURNAL_MAX": str(4 * 1024 * 1024)}
+
+
+class FileStorageTestCase(unittest.TestCase):
+    """Base of the FileStorage tests: each test gets a storage writing to a
+    temporary directory, in the mode of the class attributes whatever the
+    environment, and the class-level state of FileStorage is emptied
+    before and restored after it"""
+    mode = "snapshot"
+    lazy = False
+    packed = False
+    flush_interval = 0
+    # class-level attributes of FileStorage and their empty values
+    shared = {"objects": dict, "classes": dict, "refs": dict,
+              "ref_values": dict, "records": dict, "pending": set,
+              "changes": dict, "encoded": dict,
+              "shards_loaded": lambda: (None, {}), "indexed": lambda: None,
+              "loaded": lambda: (None, None), "shared": lambda: False}
+
+    def setUp(self):
+        """Set up an empty storage writing to a temporary directory"""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "file.json")
+        self.saved_state = {}
+        for name, empty in self.shared.items():
+            attr = "_FileStorage__" + name
+            self.saved_state[attr] = getattr(FileStorage, attr)
+            setattr(FileStorage, attr, empty())
+        with mock.patch.dict(os.environ, file_environ(
+                self.mode, self.lazy, self.packed, self.flush_interval)):
+            self.storage = FileStorage()
+        self.storage._FileStorage__file_path = self.path
+
+    def tearDown(self):
+        """Stop the flusher, restore the class-level state and remove the
+        temporary files"""
+        flusher = self.storage._FileStorage__flusher
+        if flusher is not None:
+            # wakes the flusher up, which then stops with nothing to write
+            with self.storage._FileStorage__flush_wanted:
+                self.storage._FileStorage__flush_interval = 0
+                self.storage._FileStorage__flush_batch = 0
+                self.storage._FileStorage__saves = 0
+                self.storage._FileStorage__flush_wanted.notify()
+            flusher.join()
+        for attr, value in self.saved_state.items():
+            setattr(FileStorage, attr, value)
+        self.tmp.cleanup()
+
+
 class TestFileStorage(unittest.TestCase):
     """Test the FileStorage class"""
     @unittest.skipIf(models.storage_t == 'db', "not testing file storage")
@@ -97,7 +162,8 @@ class TestFileStorage(unittest.TestCase):
     @unittest.skipIf(models.storage_t == 'db', "not testing file storage")
     def test_save(self):
         """Test that save properly saves objects to file.json"""
-        storage = FileStorage()
+        with mock.patch.dict(os.environ, file_environ()):
+            storage = FileStorage()
         new_dict = {}
         for key, value in classes.items():
             instance = value()
@@ -123,6 +189,14 @@ class TestFileStorage(unittest.TestCase):
         # Test that object returned by get is same as obj
         self.assertIs(obj, models.storage.get(obj_class, obj.id))
 
+    @unittest.skipIf(models.storage_t == 'db', "not testing file storage")
+    def test_get_missing(self):
+        """Test that get returns None for unknown ids and classes"""
+        storage = FileStorage()
+        self.assertIsNone(storage.get(State, "not-an-id"))
+        self.assertIsNone(storage.get(None, "not-an-id"))
+        self.assertIsNone(storage.get(State, None))
+
     @unittest.skipIf(models.storage_t == 'db', "not testing file storage")
     def test_count_with_class(self):
         """Test that count returns the correct number of objects in storage"""
@@ -134,3 +208,776 @@ class TestFileStorage(unittest.TestCase):
         """Test that count returns the correct number of objects in storage"""
         obj_count = len(models.storage.all())
         self.assertEqual(obj_count, models.storage.count())
+
+
+@unittest.skipIf(models.storage_t in ('db', 'sqlite'),
+                 "not testing file storage")
+class TestFileStorageIndexes(FileStorageTestCase):
+    """Test the lookups and per-class indexes of the FileStorage class"""
+    def test_get_latency_is_flat(self):
+        """Test that get does not slow down as the store grows"""
+        def time_get(size):
+            """returns the best time of 1000 gets in a store of size"""
+            FileStorage._FileStorage__objects = {}
+            for i in range(size):
+                self.storage.new(Review())
+            obj = Review()
+            self.storage.new(obj)
+            return min(timeit.repeat(lambda: self.storage.get(Review, obj.id),
+                                     number=1000, repeat=5))
+
+        small = time_get(10)
+        large = time_get(20000)
+        self.assertLess(large, small * 10)
+
+    def test_counts(self):
+        """Test that counts follows new and delete without a scan"""
+        state = State(name="California")
+        self.storage.new(state)
+        self.storage.new(City(state_id=state.id))
+        self.storage.new(City(state_id=state.id))
+        with mock.patch.object(FileStorage, "all") as all_:
+            self.assertEqual(self.storage.counts(State, "City", User),
+                             {"State": 1, "City": 2, "User": 0})
+            self.storage.delete(state)
+            self.assertEqual(self.storage.counts(State), {"State": 0})
+            self.assertEqual(self.storage.counts()["City"], 2)
+        self.assertFalse(all_.called)
+
+    def test_all_with_class(self):
+        """Test that all(cls) returns only the objects of that class"""
+        state = State()
+        city = City()
+        self.storage.new(state)
+        self.storage.new(city)
+        self.assertEqual(self.storage.all(State),
+                         {"State." + state.id: state})
+        self.assertEqual(self.storage.all("City"), {"City." + city.id: city})
+        self.assertEqual(self.storage.all(User), {})
+
+    def test_delete_updates_class_index(self):
+        """Test that delete removes the object from all(cls) and count"""
+        state = State()
+        self.storage.new(state)
+        self.assertEqual(self.storage.count(State), 1)
+        self.storage.delete(state)
+        self.assertEqual(self.storage.all(State), {})
+        self.assertEqual(self.storage.count(State), 0)
+        self.assertEqual(self.storage.count(), 0)
+
+    def test_class_index_follows_replaced_objects(self):
+        """Test that the class index is rebuilt when __objects is swapped"""
+        objects = FileStorage._FileStorage__objects
+        amenity = Amenity()
+        FileStorage._FileStorage__objects = {"Amenity." + amenity.id: amenity}
+        self.assertEqual(self.storage.all(Amenity),
+                         {"Amenity." + amenity.id: amenity})
+        FileStorage._FileStorage__objects = objects
+        self.assertNotIn("Amenity." + amenity.id, self.storage.all(Amenity))
+
+
+class TestIterItems(unittest.TestCase):
+    """Test the incremental JSON reader used by FileStorage.reload"""
+    def test_matches_json_load(self):
+        """Test that any chunk size yields the pairs json.load finds"""
+        content = {"State.1": {"name": "a \\\" : , } b", "n": [1, {}]},
+                   "City.2": {"name": "\u00e9", "x": 1.5e3},
+                   "User.3": {}}
+        text = json.dumps(content, indent=2)
+        for size in (1, 2, 7, 64, 65536):
+            with self.subTest(size=size):
+                items = list(file_storage.iter_items(io.StringIO(text),
+                                                     size))
+                self.assertEqual(dict(items), content)
+                self.assertEqual([key for key, value in items],
+                                 list(content))
+
+    def test_empty_object(self):
+        """Test that an empty object yields nothing"""
+        self.assertEqual(list(file_storage.iter_items(io.StringIO(" {} "))),
+                         [])
+
+    def test_malformed(self):
+        """Test that truncated or invalid files raise ValueError"""
+        for text in ('', '{"a": {"b": 1}', '{"a": {"b": ', '[1, 2]',
+                     '{"a" {}}'):
+            with self.subTest(text=text):
+                with self.assertRaises(ValueError):
+                    list(file_storage.iter_items(io.StringIO(text), 3))
+
+
+@unittest.skipIf(models.storage_t in ('db', 'sqlite'),
+                 "not testing file storage")
+class TestFileStorageDirtyTracking(FileStorageTestCase):
+    """Test that FileStorage only re-serializes changed objects"""
+    def setUp(self):
+        """Save a state and a user"""
+        super().setUp()
+        self.state = State(name="California")
+        self.user = User(email="a@b.c", password="pwd")
+        self.storage.new(self.state)
+        self.storage.new(self.user)
+        self.storage.save()
+
+    def saved(self):
+        """returns the content of the JSON file"""
+        with open(self.path) as f:
+            return json.load(f)
+
+    def test_bulk_new(self):
+        """Test that bulk_new stores and indexes objects for one save"""
+        cities = [City(name="City {}".format(i), state_id=self.state.id)
+                  for i in range(3)]
+        self.storage.bulk_new(cities)
+        self.assertIs(self.storage.get(City, cities[1].id), cities[1])
+        self.assertEqual(len(self.storage.related(City, "state_id",
+                                                  self.state.id)), 3)
+        self.storage.save()
+        saved = self.saved()
+        for city in cities:
+            self.assertEqual(saved["City." + city.id], city.to_dict())
+
+    def test_save_encodes_changed_objects_only(self):
+        """Test that a save after one change calls to_dict once"""
+        with mock.patch.object(BaseModel, "to_dict", autospec=True,
+                               side_effect=BaseModel.to_dict) as to_dict:
+            self.user.first_name = "Betty"
+            self.storage.save()
+        self.assertEqual(to_dict.call_count, 1)
+        self.assertEqual(self.saved()["User." + self.user.id]["first_name"],
+                         "Betty")
+        self.assertEqual(self.saved()["State." + self.state.id],
+                         self.state.to_dict())
+
+    def test_attribute_write_marks_dirty(self):
+        """Test that attribute writes are saved without calling obj.save"""
+        self.state.name = "Nevada"
+        self.storage.save()
+        self.assertEqual(self.saved()["State." + self.state.id]["name"],
+                         "Nevada")
+
+    def test_delete_marks_dirty(self):
+        """Test that deleted objects are dropped on the next save"""
+        self.storage.delete(self.state)
+        self.storage.save()
+        self.assertEqual(list(self.saved()), ["User." + self.user.id])
+
+    def test_save_replaces_file(self):
+        """Test that save writes a temporary file then replaces the JSON
+        file, which a failed write leaves untouched"""
+        with open(self.path) as f:
+            before = f.read()
+        self.state.name = "Nevada"
+        with mock.patch.object(file_storage.os, "replace",
+                               side_effect=OSError) as replace:
+            with self.assertRaises(OSError):
+                self.storage.save()
+        replace.assert_called_once_with(self.path + ".tmp", self.path)
+        with open(self.path) as f:
+            self.assertEqual(f.read(), before)
+        self.storage.save()
+        self.assertEqual(self.saved()["State." + self.state.id]["name"],
+                         "Nevada")
+
+    def test_unstored_object_is_not_dirty(self):
+        """Test that writes to objects outside storage are not tracked"""
+        other = State(name="Texas")
+        other.name = "Utah"
+        self.assertNotIn("State." + other.id,
+                         FileStorage._FileStorage__changes)
+
+
+@unittest.skipIf(models.storage_t in ('db', 'sqlite'),
+                 "not testing file storage")
+class TestFileStorageReload(FileStorageTestCase):
+    """Test that FileStorage only reloads files that changed"""
+    def setUp(self):
+        """Save a state and a city"""
+        super().setUp()
+        self.state = State(name="California")
+        self.city = City(name="Fremont", state_id=self.state.id)
+        self.storage.new(self.state)
+        self.storage.new(self.city)
+        self.storage.save()
+
+    def test_close_skips_unchanged_file(self):
+        """Test that close does not parse a file that did not change"""
+        with mock.patch.object(file_storage, "iter_items",
+                               wraps=file_storage.iter_items) as parse:
+            self.storage.close()
+            self.assertFalse(parse.called)
+            os.utime(self.path, ns=(0, 0))
+            self.storage.close()
+            self.assertTrue(parse.called)
+        self.assertIs(self.storage.get(State, self.state.id), self.state)
+
+    def test_reload_merges_changed_objects(self):
+        """Test that only objects changed in the file are rebuilt"""
+        with open(self.path) as f:
+            content = json.load(f)
+        content["City." + self.city.id]["name"] = "Oakland"
+        with open(self.path, "w") as f:
+            json.dump(content, f)
+        os.utime(self.path, ns=(0, 0))
+        self.storage.close()
+        self.assertIs(self.storage.get(State, self.state.id), self.state)
+        city = self.storage.get(City, self.city.id)
+        self.assertIsNot(city, self.city)
+        self.assertEqual(city.name, "Oakland")
+        self.assertEqual(self.state.cities, [city])
+
+
+@unittest.skipIf(models.storage_t in ('db', 'sqlite'),
+                 "not testing file storage")
+class TestFileStorageLazy(FileStorageTestCase):
+    """Test the lazy hydration mode of the FileStorage class"""
+    lazy = True
+
+    def setUp(self):
+        """Save a few objects then reload them as records"""
+        super().setUp()
+        self.state = State(name="California")
+        self.city = City(name="Fremont", state_id=self.state.id)
+        self.user = User(email="a@b.c", password="pwd")
+        for obj in (self.state, self.city, self.user):
+            self.storage.new(obj)
+        self.storage.save()
+        FileStorage._FileStorage__objects = {}
+        self.storage.reload()
+
+    def test_reload_builds_no_objects(self):
+        """Test that reload only keeps records"""
+        self.assertEqual(FileStorage._FileStorage__objects, {})
+        self.assertEqual(self.storage.count(), 3)
+        self.assertEqual(self.storage.count(State), 1)
+
+    def test_get_builds_one_object(self):
+        """Test that get only builds the object it returns"""
+        state = self.storage.get(State, self.state.id)
+        self.assertEqual(state.to_dict(), self.state.to_dict())
+        self.assertEqual(list(FileStorage._FileStorage__objects),
+                         ["State." + self.state.id])
+        self.assertIs(self.storage.get(State, self.state.id), state)
+
+    def test_all_builds_objects(self):
+        """Test that all(cls) builds the class and all() everything"""
+        self.assertEqual(list(self.storage.all(City)),
+                         ["City." + self.city.id])
+        self.assertEqual(len(FileStorage._FileStorage__objects), 1)
+        self.assertEqual(len(self.storage.all()), 3)
+        self.assertEqual(self.storage.count(), 3)
+
+    def test_iter_builds_batches(self):
+        """Test that iter builds the records one batch at a time"""
+        for i in range(4):
+            self.storage.new(City(name="City {}".format(i)))
+        records = self.storage._FileStorage__records
+        objs = self.storage.iter(City, batch_size=2)
+        next(objs)
+        self.assertEqual(list(records["City"]), ["City." + self.city.id])
+        self.assertEqual(len(list(objs)), 4)
+        self.assertNotIn("City", records)
+        self.assertIs(self.storage.get(City, self.city.id),
+                      self.storage.all(City)["City." + self.city.id])
+        self.assertEqual({"{}.{}".format(type(obj).__name__, obj.id)
+                          for obj in self.storage.iter()},
+                         set(self.storage.all()))
+
+    def test_related_builds_objects(self):
+        """Test that relationship properties see unbuilt records"""
+        state = self.storage.get(State, self.state.id)
+        self.assertEqual([city.id for city in state.cities], [self.city.id])
+
+    def test_save_keeps_records(self):
+        """Test that save writes records that were never built"""
+        self.storage.get(User, self.user.id).first_name = "Betty"
+        self.storage.save()
+        with open(self.path) as f:
+            content = json.load(f)
+        self.assertEqual(content["State." + self.state.id],
+                         self.state.to_dict())
+        self.assertEqual(content["User." + self.user.id]["first_name"],
+                         "Betty")
+
+    def test_build_drops_record_text(self):
+        """Test that building a record drops the JSON text cached for it"""
+        self.storage.save()
+        encoded = FileStorage._FileStorage__encoded
+        # packed records are never cached
+        self.assertEqual("State." + self.state.id in encoded, not self.packed)
+        self.storage.all(State)
+        self.storage.get(User, self.user.id)
+        self.assertNotIn("State." + self.state.id, encoded)
+        self.assertNotIn("User." + self.user.id, encoded)
+
+    def test_delete_record(self):
+        """Test that delete drops records that were never built"""
+        self.storage.delete(self.city)
+        self.assertEqual(self.storage.count(City), 0)
+        self.assertIsNone(self.storage.get(City, self.city.id))
+
+
+@unittest.skipIf(models.storage_t in ('db', 'sqlite'),
+                 "not testing file storage")
+class TestFileStorageCompact(TestFileStorageLazy):
+    """Test the compact mode of the FileStorage class, which runs the lazy
+    mode tests on packed records"""
+    packed = True
+
+    def test_pack(self):
+        """Test that pack and unpack round trip a to_dict() record"""
+        record = self.city.to_dict()
+        packed = file_storage.pack(record)
+        self.assertIs(type(packed), tuple)
+        self.assertIs(packed[0], file_storage.pack(City(
+            name="Oakland", state_id="x").to_dict())[0])
+        self.assertIs(type(packed[packed[0].index("created_at") + 1]), int)
+        self.assertEqual(file_storage.unpack(packed), record)
+        record["updated_at"] = "2017-09-28T21:03:54"
+        self.assertIs(file_storage.pack(record), record)
+
+    def test_ids_are_shared(self):
+        """Test that the objects built from the records share their ids"""
+        other = City(name="Oakland", state_id=self.state.id)
+        self.storage.new(other)
+        self.storage.save()
+        FileStorage._FileStorage__objects = {}
+        self.storage.reload()
+        records = self.storage._FileStorage__records["City"]
+        self.assertTrue(all(type(r) is tuple for r in records.values()))
+        cities = list(self.storage.all(City).values())
+        self.assertEqual(len(cities), 2)
+        self.assertIs(cities[0].state_id, cities[1].state_id)
+        self.assertIs(type(cities[0].created_at), datetime)
+
+    def test_memory_stats(self):
+        """Test that memory_stats counts objects, records and their size"""
+        stats = self.storage.memory_stats()
+        self.assertEqual(set(stats), set(classes))
+        self.assertEqual(stats["City"]["records"], 1)
+        self.assertEqual(stats["City"]["objects"], 0)
+        self.assertEqual(stats["Place"], {"objects": 0, "records": 0,
+                                          "bytes": 0})
+        packed = stats["City"]["bytes"]
+        seen = set()
+        unpacked = file_storage.size_of("City." + self.city.id, seen) + \
+            file_storage.size_of(self.city.to_dict(), seen)
+        self.assertLess(packed, unpacked)
+        self.storage.get(City, self.city.id)
+        stats = self.storage.memory_stats()
+        self.assertEqual(stats["City"]["records"], 0)
+        self.assertEqual(stats["City"]["objects"], 1)
+        self.assertGreater(stats["City"]["bytes"], 0)
+
+
+@unittest.skipIf(models.storage_t in ('db', 'sqlite'),
+                 "not testing file storage")
+class TestFileStorageSharded(FileStorageTestCase):
+    """Test the sharded layout of the FileStorage class"""
+    mode = "sharded"
+
+    def setUp(self):
+        """Save a state and a city in the sharded layout"""
+        super().setUp()
+        self.shards = os.path.join(self.tmp.name, "file_shards")
+        self.state = State(name="California")
+        self.city = City(name="Fremont", state_id=self.state.id)
+        self.storage.new(self.state)
+        self.storage.new(self.city)
+        self.storage.save()
+
+    def shard(self, name):
+        """returns the content of a shard"""
+        with open(os.path.join(self.shards, name)) as f:
+            return json.load(f)
+
+    def test_save_writes_one_file_per_class(self):
+        """Test that save writes the files of the changed classes"""
+        self.assertEqual(sorted(os.listdir(self.shards)),
+                         ["cities.json", "states.json"])
+        self.assertEqual(self.shard("states.json"),
+                         {"State." + self.state.id: self.state.to_dict()})
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_save_rewrites_changed_shards_only(self):
+        """Test that save leaves the files of unchanged classes alone"""
+        cities = os.path.join(self.shards, "cities.json")
+        os.utime(cities, ns=(0, 0))
+        self.state.name = "Nevada"
+        self.storage.save()
+        self.assertEqual(os.stat(cities).st_mtime_ns, 0)
+        self.assertEqual(
+            self.shard("states.json")["State." + self.state.id]["name"],
+            "Nevada")
+
+    def test_reload_parses_shards_on_demand(self):
+        """Test that reload defers parsing until a class is needed"""
+        FileStorage._FileStorage__objects = {}
+        self.storage.reload()
+        self.assertEqual(FileStorage._FileStorage__objects, {})
+        state = self.storage.get(State, self.state.id)
+        self.assertEqual(state.name, "California")
+        self.assertEqual(list(FileStorage._FileStorage__objects),
+                         ["State." + self.state.id])
+        self.assertEqual(list(self.storage.related(City, "state_id",
+                                                   state.id)),
+                         ["City." + self.city.id])
+
+    def test_save_keeps_unparsed_objects(self):
+        """Test that saving a class that was never parsed keeps its file"""
+        FileStorage._FileStorage__objects = {}
+        self.storage.reload()
+        other = State(name="Texas")
+        self.storage.new(other)
+        self.storage.save()
+        self.assertEqual(sorted(self.shard("states.json")),
+                         sorted(["State." + self.state.id,
+                                 "State." + other.id]))
+
+    def test_migrate_to_shards(self):
+        """Test that migrate_to_shards splits an existing JSON file"""
+        user = User(email="a@b.c", password="pwd")
+        with open(self.path, "w") as f:
+            json.dump({"User." + user.id: user.to_dict(),
+                       "State." + self.state.id: self.state.to_dict()}, f)
+        self.storage.migrate_to_shards()
+        self.assertEqual(self.shard("users.json"),
+                         {"User." + user.id: user.to_dict()})
+        self.assertEqual(self.shard("cities.json"), {})
+        FileStorage._FileStorage__objects = {}
+        self.storage.reload()
+        self.assertEqual(self.storage.count(), 2)
+
+
+@unittest.skipIf(models.storage_t in ('db', 'sqlite'),
+                 "not testing file storage")
+class TestFileStorageForeignKeys(FileStorageTestCase):
+    """Test the foreign key reverse indexes of the FileStorage class"""
+    def setUp(self):
+        """Store a state and a city"""
+        super().setUp()
+        self.state = State(name="California")
+        self.city = City(name="Fremont", state_id=self.state.id)
+        self.storage.new(self.state)
+        self.storage.new(self.city)
+
+    def test_related(self):
+        """Test that related returns the objects referencing a value"""
+        self.assertEqual(self.storage.related(City, "state_id",
+                                              self.state.id),
+                         {"City." + self.city.id: self.city})
+        self.assertEqual(self.storage.related("City", "state_id", "x"), {})
+        self.assertEqual(self.state.cities, [self.city])
+
+    def test_attribute_change_moves_object(self):
+        """Test that changing a foreign key updates the index"""
+        other = State(name="Nevada")
+        self.storage.new(other)
+        self.city.state_id = other.id
+        self.assertEqual(self.state.cities, [])
+        self.assertEqual(other.cities, [self.city])
+
+    def test_delete_removes_object(self):
+        """Test that deleted objects leave the index"""
+        self.storage.delete(self.city)
+        self.assertEqual(self.state.cities, [])
+
+    def test_relationship_properties(self):
+        """Test City.places, Place.reviews and User.places/reviews"""
+        user = User(email="a@b.c", password="pwd")
+        place = Place(city_id=self.city.id, user_id=user.id, name="Home")
+        review = Review(place_id=place.id, user_id=user.id, text="Nice")
+        for obj in (user, place, review):
+            self.storage.new(obj)
+        self.assertEqual(self.city.places, [place])
+        self.assertEqual(place.reviews, [review])
+        self.assertEqual(user.places, [place])
+        self.assertEqual(user.reviews, [review])
+
+
+@unittest.skipIf(models.storage_t in ('db', 'sqlite'),
+                 "not testing file storage")
+class TestFileStorageWriteBehind(FileStorageTestCase):
+    """Test the background flusher of the FileStorage class"""
+    flush_interval = 60
+
+    def setUp(self):
+        """Flush the storage after 3 saves"""
+        super().setUp()
+        self.storage._FileStorage__flush_batch = 3
+
+    def wait_for_file(self):
+        """waits for the flusher to write the JSON file"""
+        for i in range(200):
+            if os.path.exists(self.path):
+                return True
+            time.sleep(0.01)
+        return False
+
+    def test_save_defers_writes(self):
+        """Test that save returns before writing and flush writes"""
+        state = State(name="California")
+        self.storage.new(state)
+        self.storage.save()
+        self.assertFalse(os.path.exists(self.path))
+        self.storage.flush()
+        with open(self.path) as f:
+            self.assertIn("State." + state.id, json.load(f))
+
+    def test_batch_triggers_flush(self):
+        """Test that the flusher writes once enough saves are waiting"""
+        for i in range(3):
+            self.storage.new(State(name="State {}".format(i)))
+            self.storage.save()
+        self.assertTrue(self.wait_for_file())
+        with open(self.path) as f:
+            self.assertEqual(len(json.load(f)), 3)
+
+    def test_interval_triggers_flush(self):
+        """Test that the flusher writes once the interval is over"""
+        self.storage._FileStorage__flush_interval = 0.05
+        self.storage.new(State(name="California"))
+        self.storage.save()
+        self.assertTrue(self.wait_for_file())
+
+    def test_flusher_survives_errors(self):
+        """Test that a failed flush is logged and retried"""
+        self.storage._FileStorage__flush_interval = 0.05
+        self.storage._FileStorage__file_path = os.path.join(
+            self.tmp.name, "missing", "file.json")
+        with self.assertLogs(file_storage.logger, "ERROR"):
+            self.storage.new(State(name="California"))
+            self.storage.save()
+            time.sleep(0.1)
+        self.assertTrue(self.storage._FileStorage__flusher.is_alive())
+        self.storage._FileStorage__file_path = self.path
+        self.assertTrue(self.wait_for_file())
+
+    def test_fsync_durability(self):
+        """Test that fsync durability writes and syncs on every save"""
+        self.storage._FileStorage__durability = "fsync"
+        self.storage.new(State(name="California"))
+        with mock.patch.object(file_storage.os, "fsync") as fsync:
+            self.storage.save()
+        self.assertTrue(fsync.called)
+        self.assertTrue(os.path.exists(self.path))
+
+
+@unittest.skipIf(models.storage_t in ('db', 'sqlite'),
+                 "not testing file storage")
+class TestFileStorageThreads(FileStorageTestCase):
+    """Stress test FileStorage with concurrent readers and writers"""
+    def setUp(self):
+        """Switch threads as often as possible"""
+        super().setUp()
+        self.interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+
+    def tearDown(self):
+        """Restore the switch interval"""
+        sys.setswitchinterval(self.interval)
+        super().tearDown()
+
+    def test_concurrent_reads_and_writes(self):
+        """Test that readers iterate safely while writers change objects"""
+        storage = self.storage
+        errors = []
+        done = threading.Event()
+
+        def writer():
+            """creates, updates, deletes and saves objects"""
+            try:
+                for i in range(300):
+                    state = State(name="State {}".format(i))
+                    storage.new(state)
+                    city = City(name="City", state_id=state.id)
+                    storage.new(city)
+                    state.name = "Renamed {}".format(i)
+                    if i % 3 == 0:
+                        storage.delete(city)
+                    if i % 50 == 0:
+                        storage.save()
+                        storage.close()
+            except Exception as e:
+                errors.append(e)
+
+        def reader():
+            """iterates over the objects until the writers are done"""
+            try:
+                while not done.is_set():
+                    for obj in storage.all().values():
+                        obj.to_dict()
+                    for key in storage.all(State):
+                        storage.get(State, key.split(".", 1)[1])
+                    for state in list(storage.all(State).values())[:5]:
+                        state.cities
+                    storage.count(City)
+            except Exception as e:
+                errors.append(e)
+
+        writers = [threading.Thread(target=writer) for i in range(4)]
+        readers = [threading.Thread(target=reader) for i in range(4)]
+        for thread in readers + writers:
+            thread.start()
+        for thread in writers:
+            thread.join()
+        done.set()
+        for thread in readers:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(storage.count(State), 1200)
+        self.assertEqual(storage.count(City), 800)
+        self.assertEqual(storage.count(), len(storage.all()))
+
+
+@unittest.skipIf(models.storage_t in ('db', 'sqlite'),
+                 "not testing file storage")
+class TestFileStorageFilter(FileStorageTestCase):
+    """Test the filter query method of the FileStorage class"""
+    def setUp(self):
+        """Store a few places"""
+        super().setUp()
+        self.places = []
+        for i, city_id in enumerate(["a", "b", "a", "a"]):
+            place = Place(city_id=city_id, user_id="u", name="P{}".format(i),
+                          price_by_night=(i * 7) % 4)
+            self.storage.new(place)
+            self.places.append(place)
+
+    def test_equals(self):
+        """Test that filter keeps the objects with the given values"""
+        p = self.places
+        self.assertEqual(self.storage.filter(Place, city_id="a"),
+                         [p[0], p[2], p[3]])
+        self.assertEqual(self.storage.filter("Place", city_id="a",
+                                             name="P2"), [p[2]])
+        self.assertEqual(self.storage.filter(Place, name="P1"), [p[1]])
+        self.assertEqual(self.storage.filter(Place, id=p[3].id), [p[3]])
+        self.assertEqual(self.storage.filter(Place, city_id="x"), [])
+        self.assertEqual(self.storage.filter(City), [])
+
+    def test_uses_index(self):
+        """Test that filter on a foreign key does not scan the class"""
+        with mock.patch.object(FileStorage, "all") as all_:
+            self.storage.filter(Place, city_id="a", user_id="u")
+        self.assertFalse(all_.called)
+
+    def test_order_limit_offset(self):
+        """Test ordering and slicing of the results"""
+        p = self.places
+        self.assertEqual(self.storage.filter(Place, order_by="name"), p)
+        self.assertEqual(self.storage.filter(Place, order_by="-name"),
+                         p[::-1])
+        self.assertEqual(self.storage.filter(
+            Place, order_by=["price_by_night", "-name"]),
+            [p[0], p[3], p[2], p[1]])
+        self.assertEqual(self.storage.filter(Place, order_by="name",
+                                             limit=2, offset=1), p[1:3])
+        self.assertEqual(self.storage.filter(Place, order_by="name",
+                                             offset=3), p[3:])
+
+    def test_after(self):
+        """Test that filter starts past a keyset cursor"""
+        p = self.places
+        self.assertEqual(self.storage.filter(Place, order_by=["name"],
+                                             after=("P1",)), p[2:])
+        self.assertEqual(self.storage.filter(
+            Place, order_by=["price_by_night", "-name"], limit=2,
+            after=(p[3].price_by_night, p[3].name)), [p[2], p[1]])
+        self.assertEqual(self.storage.filter(Place, city_id="a",
+                                             order_by="-name",
+                                             after=("P3",)), [p[2], p[0]])
+
+
+@unittest.skipIf(models.storage_t in ('db', 'sqlite'),
+                 "not testing file storage")
+class TestFileStorageJournal(FileStorageTestCase):
+    """Test the journal persistence mode of the FileStorage class"""
+    mode = "journal"
+
+    def test_save_appends_changes(self):
+        """Test that save appends the changes instead of rewriting"""
+        state = State(name="California")
+        self.storage.new(state)
+        self.storage.save()
+        self.assertFalse(os.path.exists(self.path))
+        with open(self.path + ".journal") as f:
+            lines = [json.loads(line) for line in f]
+        self.assertEqual(lines, [{"op": "upsert", "key": "State." + state.id,
+                                  "obj": state.to_dict()}])
+        self.storage.save()
+        with open(self.path + ".journal") as f:
+            self.assertEqual(len(f.readlines()), 1)
+
+    def test_reload_replays_journal(self):
+        """Test that reload applies upserts and deletes from the journal"""
+        state = State(name="California")
+        city = City(name="Fremont", state_id=state.id)
+        self.storage.new(state)
+        self.storage.new(city)
+        self.storage.save()
+        self.storage.delete(city)
+        self.storage.save()
+        FileStorage._FileStorage__objects = {}
+        self.storage.reload()
+        self.assertEqual(list(self.storage.all()), ["State." + state.id])
+        self.assertEqual(self.storage.get(State, state.id).name, "California")
+
+    def test_reload_ignores_torn_line(self):
+        """Test that a partially written last line is ignored on reload"""
+        state = State(name="California")
+        self.storage.new(state)
+        self.storage.save()
+        with open(self.path + ".journal", "a") as f:
+            f.write('{"op": "delete", "ke')
+        FileStorage._FileStorage__objects = {}
+        self.storage.reload()
+        self.assertIn("State." + state.id, self.storage.all())
+
+    def test_compaction(self):
+        """Test that the journal is folded into the JSON file when full"""
+        self.storage._FileStorage__journal_max = 0
+        state = State(name="California")
+        self.storage.new(state)
+        self.storage.save()
+        self.assertFalse(os.path.exists(self.path + ".journal"))
+        with open(self.path) as f:
+            self.assertEqual(json.load(f),
+                             {"State." + state.id: state.to_dict()})
+        FileStorage._FileStorage__objects = {}
+        self.storage.reload()
+        self.assertIn("State." + state.id, self.storage.all())
+
+    def test_compaction_keeps_changes_of_other_writers(self):
+        """Test that compaction merges the journal lines another process
+        appended instead of dropping them"""
+        state = State(name="California")
+        self.storage.new(state)
+        self.storage.save()
+        self.storage.close()
+        other = State(name="Nevada")
+        with open(self.path + ".journal", "a") as f:
+            f.write(json.dumps({"op": "upsert", "key": "State." + other.id,
+                                "obj": other.to_dict()}) + "\n")
+        self.storage._FileStorage__journal_max = 0
+        self.storage.new(State(name="Texas"))
+        self.storage.save()
+        self.assertFalse(os.path.exists(self.path + ".journal"))
+        with open(self.path) as f:
+            self.assertIn("State." + other.id, json.load(f))
+        self.storage.close()
+        self.assertEqual(self.storage.get(State, other.id).name, "Nevada")
+        self.assertEqual(self.storage.count(State), 3)
+
+    def test_compact_takes_lock(self):
+        """Test that compact waits for the changes being made"""
+        self.storage.new(State(name="California"))
+        self.storage.save()
+        lock = FileStorage._FileStorage__lock
+        with lock:
+            thread = threading.Thread(target=self.storage.compact)
+            thread.start()
+            thread.join(0.1)
+            self.assertTrue(thread.is_alive())
+        thread.join()
+        self.assertFalse(os.path.exists(self.path + ".journal"))
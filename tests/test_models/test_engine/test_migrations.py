@@ -0,0 +1,119 @@
+#!/usr/bin/python3
+"""
+Contains the TestMigrationsDocs and TestMigrations classes
+"""
+
+import inspect
+from models.engine import migrations
+import os
+import pep8
+from sqlalchemy import create_engine, text
+import sqlalchemy
+import tempfile
+import unittest
+
+
+class TestMigrationsDocs(unittest.TestCase):
+    """Tests to check the documentation and style of migrations.py"""
+    def test_pep8_conformance_migrations(self):
+        """Test that models/engine/migrations.py conforms to PEP8."""
+        pep8s = pep8.StyleGuide(quiet=True)
+        result = pep8s.check_files(['models/engine/migrations.py'])
+        self.assertEqual(result.total_errors, 0,
+                         "Found code style errors (and warnings).")
+
+    def test_pep8_conformance_test_migrations(self):
+        """Test tests/test_models/test_migrations.py conforms to PEP8."""
+        pep8s = pep8.StyleGuide(quiet=True)
+        result = pep8s.check_files(['tests/test_models/test_engine/\
+test_migrations.py'])
+        self.assertEqual(result.total_errors, 0,
+                         "Found code style errors (and warnings).")
+
+    def test_migrations_module_docstring(self):
+        """Test for the migrations.py module docstring"""
+        self.assertIsNot(migrations.__doc__, None,
+                         "migrations.py needs a docstring")
+        self.assertTrue(len(migrations.__doc__) >= 1,
+                        "migrations.py needs a docstring")
+
+    def test_migrations_func_docstrings(self):
+        """Test for the presence of docstrings in migrations functions"""
+        for name, func in inspect.getmembers(migrations, inspect.isfunction):
+            if func.__module__ == migrations.__name__:
+                self.assertTrue(func.__doc__,
+                                "{:s} needs a docstring".format(name))
+
+
+class TestMigrations(unittest.TestCase):
+    """Test the migration runner on a database created before indexes"""
+    def setUp(self):
+        """Create the tables of an existing database, without indexes"""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.engine = create_engine("sqlite:///" + os.path.join(
+            self.tmp.name, "hbnb.db"))
+        columns = {"amenities": "", "states": "", "users": ", email TEXT",
+                   "cities": ", state_id TEXT",
+                   "places": ", city_id TEXT, user_id TEXT",
+                   "reviews": ", place_id TEXT, user_id TEXT"}
+        with self.engine.begin() as connection:
+            for table, extra in columns.items():
+                connection.execute(text(
+                    "CREATE TABLE {} (id TEXT PRIMARY KEY, created_at TEXT"
+                    "{})".format(table, extra)))
+
+    def tearDown(self):
+        """Remove the database"""
+        self.engine.dispose()
+        self.tmp.cleanup()
+
+    def indexes(self, table):
+        """returns {name: (columns, unique)} of the indexes of table"""
+        return {index["name"]: (index["column_names"],
+                                bool(index["unique"]))
+                for index in sqlalchemy.inspect(
+                    self.engine).get_indexes(table)}
+
+    def test_migrate(self):
+        """Test that migrate adds the indexes once and records versions"""
+        self.assertEqual(migrations.version(self.engine), 0)
+        self.assertEqual(migrations.migrate(self.engine), [1, 2])
+        self.assertEqual(migrations.version(self.engine), 2)
+        self.assertEqual(self.indexes("places")[
+            "ix_places_city_id_created_at"],
+            (["city_id", "created_at", "id"], False))
+        self.assertEqual(self.indexes("users")["ix_users_email"],
+                         (["email"], True))
+        self.assertEqual(migrations.migrate(self.engine), [])
+
+    def test_existing_index(self):
+        """Test that a migration skips an index that already exists"""
+        with self.engine.begin() as connection:
+            connection.execute(text("CREATE INDEX ix_states_created_at ON "
+                                    "states (created_at, id)"))
+        self.assertEqual(migrations.migrate(self.engine), [1, 2])
+
+    def test_duplicates_leave_migration_pending(self):
+        """Test that a unique index over duplicates is reported and left
+        pending instead of failing"""
+        with self.engine.begin() as connection:
+            connection.execute(text("INSERT INTO users (id, email) VALUES "
+                                    "('1', 'a@b.c'), ('2', 'a@b.c'), "
+                                    "('3', NULL), ('4', NULL)"))
+        with self.assertLogs(migrations.logger, "WARNING") as logs:
+            self.assertEqual(migrations.migrate(self.engine), [1])
+        self.assertIn("'a@b.c'", logs.output[0])
+        self.assertEqual(migrations.version(self.engine), 1)
+        self.assertNotIn("ix_users_email", self.indexes("users"))
+        with self.engine.begin() as connection:
+            connection.execute(text("DELETE FROM users WHERE id = '2'"))
+        self.assertEqual(migrations.migrate(self.engine), [2])
+
+    def test_failed_migration(self):
+        """Test that a failing migration is not recorded"""
+        with self.engine.begin() as connection:
+            connection.execute(text("CREATE INDEX ix_users_email ON states "
+                                    "(created_at)"))
+        with self.assertRaises(sqlalchemy.exc.OperationalError):
+            migrations.migrate(self.engine)
+        self.assertEqual(migrations.version(self.engine), 1)
@@ -0,0 +1,324 @@
+#!/usr/bin/python3
+"""
+Contains the TestSQLiteStorageDocs and TestSQLiteStorage classes
+"""
+
+import inspect
+import models
+from models.engine import sqlite_storage
+from models.amenity import Amenity
+from models.base_model import BaseModel
+from models.city import City
+from models.place import Place
+from models.review import Review
+from models.state import State
+from models.user import User
+import os
+import pep8
+import sqlite3
+import tempfile
+import threading
+import unittest
+from unittest import mock
+SQLiteStorage = sqlite_storage.SQLiteStorage
+
+
+class TestSQLiteStorageDocs(unittest.TestCase):
+    """Tests to check the documentation and style of SQLiteStorage class"""
+    @classmethod
+    def setUpClass(cls):
+        """Set up for the doc tests"""
+        cls.sqs_f = inspect.getmembers(SQLiteStorage, inspect.isfunction)
+
+    def test_pep8_conformance_sqlite_storage(self):
+        """Test that models/engine/sqlite_storage.py conforms to PEP8."""
+        pep8s = pep8.StyleGuide(quiet=True)
+        result = pep8s.check_files(['models/engine/sqlite_storage.py'])
+        self.assertEqual(result.total_errors, 0,
+                         "Found code style errors (and warnings).")
+
+    def test_pep8_conformance_test_sqlite_storage(self):
+        """Test tests/test_models/test_sqlite_storage.py conforms to PEP8."""
+        pep8s = pep8.StyleGuide(quiet=True)
+        result = pep8s.check_files(['tests/test_models/test_engine/\
+test_sqlite_storage.py'])
+        self.assertEqual(result.total_errors, 0,
+                         "Found code style errors (and warnings).")
+
+    def test_sqlite_storage_module_docstring(self):
+        """Test for the sqlite_storage.py module docstring"""
+        self.assertIsNot(sqlite_storage.__doc__, None,
+                         "sqlite_storage.py needs a docstring")
+        self.assertTrue(len(sqlite_storage.__doc__) >= 1,
+                        "sqlite_storage.py needs a docstring")
+
+    def test_sqlite_storage_class_docstring(self):
+        """Test for the SQLiteStorage class docstring"""
+        self.assertIsNot(SQLiteStorage.__doc__, None,
+                         "SQLiteStorage class needs a docstring")
+        self.assertTrue(len(SQLiteStorage.__doc__) >= 1,
+                        "SQLiteStorage class needs a docstring")
+
+    def test_sqs_func_docstrings(self):
+        """Test for the presence of docstrings in SQLiteStorage methods"""
+        for func in self.sqs_f:
+            self.assertIsNot(func[1].__doc__, None,
+                             "{:s} method needs a docstring".format(func[0]))
+            self.assertTrue(len(func[1].__doc__) >= 1,
+                            "{:s} method needs a docstring".format(func[0]))
+
+
+@unittest.skipIf(models.storage_t == 'db', "not testing sqlite storage")
+class TestSQLiteStorage(unittest.TestCase):
+    """Test the SQLiteStorage class"""
+    def setUp(self):
+        """Set up a storage on a temporary database"""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "hbnb.db")
+        with mock.patch.dict(os.environ, {"HBNB_SQLITE_DB": self.path}):
+            self.storage = SQLiteStorage()
+        self.storage.reload()
+        self.state = State(name="California")
+        self.city = City(name="Fremont", state_id=self.state.id)
+        self.storage.new(self.state)
+        self.storage.new(self.city)
+        self.storage.save()
+
+    def tearDown(self):
+        """Remove the temporary database"""
+        self.storage._SQLiteStorage__thread().connection.close()
+        self.tmp.cleanup()
+
+    def test_tables_and_indexes(self):
+        """Test that reload creates one table per class and the indexes"""
+        with sqlite3.connect(self.path) as conn:
+            names = {row[0] for row in conn.execute(
+                "SELECT name FROM sqlite_master")}
+            mode = conn.execute("PRAGMA journal_mode").fetchone()[0]
+        for table in ("states", "cities", "places", "reviews", "users",
+                      "amenities"):
+            self.assertIn(table, names)
+        for index in ("ix_cities_state_id_created_at",
+                      "ix_places_city_id_created_at",
+                      "ix_reviews_place_id_created_at",
+                      "ix_reviews_user_id_created_at",
+                      "ix_states_created_at", "ix_users_email"):
+            self.assertIn(index, names)
+        self.assertEqual(mode, "wal")
+
+    def test_retired_indexes_are_dropped(self):
+        """Test that reload replaces the single column indexes"""
+        conn = self.storage._SQLiteStorage__thread().connection
+        conn.execute("CREATE INDEX ix_cities_state_id ON cities (state_id)")
+        self.storage.reload()
+        names = {row[0] for row in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'index'")}
+        self.assertNotIn("ix_cities_state_id", names)
+
+    def test_duplicate_emails_skip_unique_index(self):
+        """Test that reload reports duplicate emails instead of failing"""
+        conn = self.storage._SQLiteStorage__thread().connection
+        conn.execute("DROP INDEX ix_users_email")
+        conn.executemany("INSERT INTO users (id, email) VALUES (?, ?)",
+                         [("1", "a@b.c"), ("2", "a@b.c")])
+        conn.commit()
+        with self.assertLogs(sqlite_storage.logger, "WARNING") as logs:
+            self.storage.reload()
+        self.assertIn("'a@b.c'", logs.output[0])
+        conn.execute("DELETE FROM users WHERE id = '2'")
+        conn.commit()
+        self.storage.reload()
+        self.assertIn("ix_users_email", {row[0] for row in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'index'")})
+
+    def test_list_queries_use_indexes(self):
+        """Test with EXPLAIN that the paged queries of the list endpoints
+        read an index in order instead of sorting"""
+        conn = self.storage._SQLiteStorage__thread().connection
+        queries = []
+        conn.set_trace_callback(queries.append)
+        order = ["created_at", "id"]
+        after = (self.city.created_at, self.city.id)
+        self.storage.filter(City, state_id=self.state.id, order_by=order,
+                            limit=2, after=after)
+        self.storage.filter(Place, city_id=self.city.id, order_by=order,
+                            limit=2)
+        self.storage.filter(Review, place_id="x", order_by=order, limit=2,
+                            after=after)
+        self.storage.filter(State, order_by=order, limit=2, after=after)
+        self.storage.filter(User, order_by=order, limit=2)
+        conn.set_trace_callback(None)
+        queries = [q for q in queries if q.startswith("SELECT")]
+        self.assertEqual(len(queries), 5)
+        expected = ["ix_cities_state_id_created_at",
+                    "ix_places_city_id_created_at",
+                    "ix_reviews_place_id_created_at",
+                    "ix_states_created_at", "ix_users_created_at"]
+        for query, index in zip(queries, expected):
+            plan = " ".join(row[3] for row in conn.execute(
+                "EXPLAIN QUERY PLAN " + query))
+            self.assertIn("USING INDEX " + index, plan, query)
+            self.assertNotIn("TEMP B-TREE", plan, query)
+
+    def test_all(self):
+        """Test that all returns the objects by <class name>.id"""
+        self.assertEqual(self.storage.all(State),
+                         {"State." + self.state.id: self.state})
+        self.assertEqual(set(self.storage.all()),
+                         {"State." + self.state.id, "City." + self.city.id})
+
+    def test_save_persists_rows(self):
+        """Test that saved objects can be read back by a new storage"""
+        self.state.name = "Nevada"
+        self.storage.mark_dirty(self.state)
+        self.storage.save()
+        self.storage.close()
+        state = self.storage.get(State, self.state.id)
+        self.assertIsNot(state, self.state)
+        self.assertEqual(state.to_dict(), self.state.to_dict())
+
+    def test_extra_attributes(self):
+        """Test that attributes without a column are kept"""
+        place = Place(name="Home", amenity_ids=["a", "b"], number_rooms=3)
+        self.storage.new(place)
+        self.storage.save()
+        self.storage.close()
+        loaded = self.storage.get("Place", place.id)
+        self.assertEqual(loaded.amenity_ids, ["a", "b"])
+        self.assertEqual(loaded.number_rooms, 3)
+
+    def test_delete(self):
+        """Test that delete removes the row"""
+        self.storage.delete(self.city)
+        self.storage.save()
+        self.storage.close()
+        self.assertIsNone(self.storage.get(City, self.city.id))
+        self.assertEqual(self.storage.count(City), 0)
+
+    def test_close_discards_unsaved_changes(self):
+        """Test that close drops what was not saved"""
+        self.storage.new(State(name="Texas"))
+        self.storage.close()
+        self.assertEqual(self.storage.count(State), 1)
+
+    def test_close_in_other_thread(self):
+        """Test that close only discards the work of the calling thread"""
+        state = State(name="Texas")
+        self.storage.new(state)
+        thread = threading.Thread(target=self.storage.close)
+        thread.start()
+        thread.join()
+        self.storage.save()
+        self.assertIs(self.storage.get(State, state.id), state)
+        self.assertEqual(self.storage.count(State), 2)
+
+    def test_threads_see_committed_rows(self):
+        """Test that a thread reads the rows other threads committed"""
+        found = []
+
+        def read():
+            """reads the state in a new thread"""
+            found.append(self.storage.get(State, self.state.id))
+            self.storage.close()
+        thread = threading.Thread(target=read)
+        thread.start()
+        thread.join()
+        self.assertIsNot(found[0], self.state)
+        self.assertEqual(found[0].to_dict(), self.state.to_dict())
+
+    def test_get(self):
+        """Test that get returns the object loaded for the id"""
+        self.assertIs(self.storage.get(State, self.state.id), self.state)
+        self.assertIsNone(self.storage.get(State, "not-an-id"))
+        self.assertIsNone(self.storage.get(None, self.state.id))
+
+    def test_count(self):
+        """Test that count counts saved and pending objects"""
+        self.storage.new(User(email="a@b.c", password="pwd"))
+        self.assertEqual(self.storage.count(), 3)
+        self.assertEqual(self.storage.count(User), 1)
+        self.assertEqual(self.storage.counts(State, "User", Place),
+                         {"State": 1, "User": 1, "Place": 0})
+        self.assertEqual(sum(self.storage.counts().values()), 3)
+
+    def test_related(self):
+        """Test that related looks up the objects through a column"""
+        self.assertEqual(self.storage.related(City, "state_id",
+                                              self.state.id),
+                         {"City." + self.city.id: self.city})
+        self.assertEqual(self.storage.related(City, "state_id", "x"), {})
+
+    def test_bulk_new(self):
+        """Test that bulk_new objects are inserted by the next save"""
+        cities = [City(name="City {}".format(i), state_id=self.state.id)
+                  for i in range(3)]
+        self.storage.bulk_new(cities)
+        self.storage.save()
+        self.storage.close()
+        self.assertEqual(self.storage.count(City), 4)
+        self.assertEqual(self.storage.get(City, cities[2].id).name,
+                         "City 2")
+
+    def test_iter(self):
+        """Test that iter streams every row in batches"""
+        cities = [City(name="City {}".format(i)) for i in range(5)]
+        for city in cities:
+            self.storage.new(city)
+        self.storage.save()
+        self.storage.close()
+        ids = [city.id for city in self.storage.iter(City, batch_size=2)]
+        self.assertEqual(sorted(ids),
+                         sorted([self.city.id] + [c.id for c in cities]))
+        self.assertEqual(len(list(self.storage.iter())), 7)
+
+    def test_filter(self):
+        """Test that filter queries, orders and slices"""
+        places = []
+        for i, city_id in enumerate(["a", "b", "a", "a"]):
+            place = Place(city_id=city_id, name="P{}".format(i))
+            self.storage.new(place)
+            places.append(place)
+        place = places[0]
+        self.assertEqual(self.storage.filter(Place, city_id="a",
+                                             order_by="name"),
+                         [places[0], places[2], places[3]])
+        self.assertEqual(self.storage.filter(Place, order_by="-name",
+                                             limit=2, offset=1),
+                         [places[2], places[1]])
+        self.assertEqual(self.storage.filter(Place, name="P3"), [places[3]])
+        keys = sorted((p.created_at, p.id) for p in places)
+        self.assertEqual([(p.created_at, p.id) for p in self.storage.filter(
+            Place, order_by=["created_at", "id"], limit=2, after=keys[0])],
+            keys[1:3])
+        self.assertEqual(self.storage.filter(Place, city_id="a",
+                                             order_by="-name",
+                                             after=("P3",)),
+                         [places[2], places[0]])
+        place.amenity_ids = ["x"]
+        self.storage.mark_dirty(place)
+        self.assertEqual(self.storage.filter(Place, amenity_ids=["x"]),
+                         [place])
+
+
+@unittest.skipIf(models.storage_t != 'sqlite', "not testing sqlite storage")
+class TestSQLiteStorageModels(unittest.TestCase):
+    """Test the models against models.storage in SQLite mode"""
+    def test_attribute_write_is_saved(self):
+        """Test that attribute writes are saved without calling new"""
+        state = State(name="California")
+        state.save()
+        state.name = "Nevada"
+        models.storage.save()
+        models.storage.close()
+        self.assertEqual(models.storage.get(State, state.id).name, "Nevada")
+
+    def test_relationships(self):
+        """Test State.cities and Place.reviews"""
+        state = State(name="California")
+        city = City(name="Fremont", state_id=state.id)
+        place = Place(name="Home", city_id=city.id)
+        review = Review(place_id=place.id, text="Nice")
+        for obj in (state, city, place, review):
+            obj.save()
+        self.assertEqual([c.id for c in state.cities], [city.id])
+        self.assertEqual([r.id for r in place.reviews], [review.id])